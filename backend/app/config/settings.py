@@ -19,6 +19,9 @@ class Settings(BaseSettings):
     JWT_SECRET_KEY: str = "your-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0  # Token đã xác thực -> (user, active, admin), 0 = tắt cache
+    AUTH_PRINCIPAL_CACHE_MAX_ENTRIES: int = 100000
+    METRICS_TOKEN: str = ""  # Bearer token cho Prometheus scrape /metrics; để trống = chỉ admin xem được
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str = ""
@@ -36,9 +39,66 @@ class Settings(BaseSettings):
     # ML Model
     MODEL_PATH: str = "mobilenetv2_dangerous_objects.pth"
     MODEL_IMG_SIZE: int = 224
+    MODEL_MAX_IMAGE_PIXELS: int = 50_000_000  # Từ chối ảnh lớn hơn (tránh decompression bomb / OOM)
+    UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024  # Kích thước tối đa của 1 ảnh upload (/predict, /predict/raw, /predict/batch)
+    MODEL_BACKEND: str = "eager"  # eager | int8 | torchscript | onnx (xem export_model.py)
+    MODEL_EXPORT_DIR: str = "data/models"  # Nơi lưu các variant đã export
+    MODEL_WARM_START_ENABLED: bool = True  # Cache artifact TorchScript đã tuning theo hash weights + phiên bản torch
+    MODEL_WARM_START_DIR: str = "data/warm_start"
+    MODEL_NOT_READY_RETRY_AFTER: int = 5  # Giây, header Retry-After khi model chưa load xong
 
     MODEL_CLASSES: list = ["Máu me", "Vũ khí", "Chiến tranh", "Nhạy cảm"]
     
+    # Inference batching / worker pool
+    INFERENCE_BATCH_MAX_SIZE: int = 16
+    INFERENCE_BATCH_MAX_WAIT_MS: float = 5.0
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_THREADS_PER_WORKER: int = 0  # 0 = cpu_count / INFERENCE_WORKERS
+    INFERENCE_MAX_QUEUE_DEPTH: int = 256  # Vượt ngưỡng -> 503
+    PREDICT_BATCH_MAX_ITEMS: int = 64  # Số ảnh tối đa trong 1 request /api/v1/predict/batch
+    DECODE_MEMORY_BUDGET_MB: int = 512  # Tổng bộ nhớ pixel decode đồng thời trong 1 process (0 = không giới hạn)
+    DECODE_MEMORY_MAX_WAIT_SECONDS: float = 2.0  # Chờ budget quá lâu -> 503
+    
+    # Cascade: first pass ở độ phân giải thấp, chỉ ảnh không chắc chắn chạy full model
+    CASCADE_ENABLED: bool = False
+    CASCADE_FIRST_PASS_SIZE: int = 128
+    CASCADE_BAND_LOW: float = 0.2  # Mọi probability < LOW hoặc > HIGH -> dùng luôn kết quả first pass
+    CASCADE_BAND_HIGH: float = 0.8
+    CASCADE_AUDIT_SAMPLE_RATE: float = 0.02  # Tỉ lệ ảnh first pass chấp nhận vẫn chạy full model để đo đồng thuận
+    
+    # Prediction cache (key = hash bytes ảnh + model version)
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    PREDICTION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # 0 = không hết hạn
+    PREDICTION_CACHE_SQLITE_PATH: str = ""  # VD: data/prediction_cache.db (để trống = chỉ cache in-process)
+    PREDICTION_CACHE_SQLITE_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Perceptual hash (dHash) near-duplicate lookup (opt-in: ảnh khác nhưng gần giống dùng lại kết quả)
+    PHASH_ENABLED: bool = False
+    PHASH_MAX_DISTANCE: int = 4  # Hamming distance tối đa (trên 64 bit) để coi là cùng ảnh
+    PHASH_MAX_ENTRIES: int = 50000
+    
+    # Triage trước inference (opt-in): ảnh hiển nhiên an toàn (icon, spacer, placeholder 1 màu) bỏ qua forward
+    TRIAGE_ENABLED: bool = False
+    TRIAGE_MIN_SIDE: int = 24  # Cạnh ngắn (pixel) nhỏ hơn -> bỏ qua
+    TRIAGE_MIN_STDDEV: float = 3.0  # Độ lệch chuẩn độ sáng thumbnail 32x32 nhỏ hơn -> ảnh gần như 1 màu
+    TRIAGE_MIN_ENTROPY: float = 0.5  # Entropy (bit) histogram độ sáng nhỏ hơn -> ảnh 2-3 màu phẳng
+    TRIAGE_AUDIT_SAMPLE_RATE: float = 0.01  # Tỉ lệ ảnh bị bỏ qua vẫn chạy inference ở background để đối chiếu
+    TRIAGE_AUDIT_THRESHOLD: float = 0.5  # Model đạt ngưỡng này trên ảnh đã bỏ qua -> tính là disagree
+    
+    # Usage log write-behind (gom nhiều request thành 1 bulk insert)
+    USAGE_LOG_BATCH_SIZE: int = 200
+    USAGE_LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    USAGE_LOG_MAX_PENDING: int = 50000  # Vượt ngưỡng (DB lỗi kéo dài) -> bỏ record cũ nhất
+    
+    # Predict by URL (/api/v1/predict/url)
+    URL_FETCH_MAX_BYTES: int = 10 * 1024 * 1024
+    URL_FETCH_TIMEOUT_SECONDS: float = 5.0  # Cho cả lần tải, kể cả redirect
+    URL_FETCH_MAX_CONNECTIONS: int = 100  # Connection pool dùng chung của httpx
+    URL_FETCH_PER_HOST_LIMIT: int = 8  # Số request đồng thời tối đa tới 1 host
+    URL_FETCH_MAX_REDIRECTS: int = 3
+    URL_FETCH_ALLOW_PRIVATE_HOSTS: bool = False  # Chỉ bật khi dev / test (chặn SSRF vào mạng nội bộ)
+    
     # Subscription Plans
     PLAN_FREE_MONTHLY_QUOTA: int = 100
     PLAN_PLUS_MONTHLY_QUOTA: int = 5000
@@ -47,6 +107,10 @@ class Settings(BaseSettings):
     PLAN_PLUS_PRICE: int = 99000  # VND
     PLAN_PRO_PRICE: int = 299000  # VND
     
+    # Cache gói active của user trong process (đường predict không query subscription)
+    SUBSCRIPTION_CACHE_TTL_SECONDS: float = 30.0  # Độ cũ tối đa khi gói đổi ở process khác, 0 = tắt cache
+    SUBSCRIPTION_CACHE_MAX_ENTRIES: int = 100000
+    
     class Config:
         env_file = BACKEND_ROOT / ".env"
         env_file_encoding = "utf-8"
@@ -10,11 +10,8 @@ from app.schemas.admin import (
     AdminUserList, AdminUserUpdate, SystemSettingItem, SystemSettingsUpdate,
     ChartsData, RevenueOvertime, NewUsersOvertime, UserPredictCallsList, UserPaymentTotalList
 )
-# Assuming there is a get_current_user dependency, likely in app.controllers.auth_controller or app.middleware
-# Based on user_controller.py check, I will find out where it is.
-# For now I will assume it's available or I'll check user_controller first.
-from app.controllers.auth_controller import get_current_user
-from app.models.user import User
+from app.middleware.auth_middleware import get_current_principal
+from app.services.principal_cache import Principal
 
 router = APIRouter(
     prefix="/admin",
@@ -23,7 +20,7 @@ router = APIRouter(
 )
 
 # Admin dependency (simple check for now, can be expanded)
-def get_current_admin(current_user: User = Depends(get_current_user)):
+def get_current_admin(current_user: Principal = Depends(get_current_principal)):
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privileges required")
     return current_user
@@ -31,7 +28,7 @@ def get_current_admin(current_user: User = Depends(get_current_user)):
 @router.get("/stats/overview", response_model=OverviewStats)
 def get_overview_stats(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_overview_stats(db)
 
@@ -39,7 +36,7 @@ def get_overview_stats(
 def get_usage_stats(
     range: str = "30d",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_usage_stats(db, range)
 
@@ -47,7 +44,7 @@ def get_usage_stats(
 def get_accuracy_stats(
     range: str = "30d",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_accuracy_stats(db, range)
 
@@ -55,7 +52,7 @@ def get_accuracy_stats(
 def get_top_categories(
     range: str = "30d",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_top_categories(db, range)
 
@@ -63,7 +60,7 @@ def get_top_categories(
 def get_recent_activities(
     limit: int = 5,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_recent_activities(db, limit)
 
@@ -76,7 +73,7 @@ def get_reports(
     category: Optional[str] = None,
     search: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_reports(db, page, limit, status, date_range, category, search)
 
@@ -85,7 +82,7 @@ def get_reports(
 def get_charts_data(
     days: int = 30,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """Get revenue and user registration data for charts"""
     return AdminService.get_charts_data(db, days)
@@ -99,7 +96,7 @@ def get_users(
     status: Optional[str] = None,
     role: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_users(db, page, limit, search, status, role)
 
@@ -108,7 +105,7 @@ def update_user_status(
     user_id: int,
     update_data: AdminUserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.update_user_status(db, user_id, update_data)
 
@@ -116,17 +113,17 @@ def update_user_status(
 def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     # Prevent admin from deleting themselves
-    if current_user.id == user_id:
+    if current_user.user_id == user_id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     return AdminService.delete_user(db, user_id)
 
 @router.get("/settings", response_model=List[SystemSettingItem])
 def get_system_settings(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.get_system_settings(db)
 
@@ -134,7 +131,7 @@ def get_system_settings(
 def update_system_settings(
     settings_update: SystemSettingsUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     return AdminService.update_system_settings(db, settings_update)
 
@@ -145,7 +142,7 @@ def update_system_settings(
 def get_revenue_overtime(
     days: int = 30,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """Get daily and cumulative revenue over time"""
     return AdminService.get_revenue_overtime(db, days)
@@ -155,7 +152,7 @@ def get_revenue_overtime(
 def get_new_users_overtime(
     days: int = 30,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """Get new user registrations over time (sorted descending)"""
     return AdminService.get_new_users_overtime(db, days)
@@ -167,7 +164,7 @@ def get_user_predict_calls(
     limit: int = 10,
     sort_desc: bool = True,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """Get total predict API calls per user"""
     return AdminService.get_user_predict_calls(db, page, limit, sort_desc)
@@ -179,7 +176,7 @@ def get_user_payment_totals(
     limit: int = 10,
     sort_desc: bool = True,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+    current_user: Principal = Depends(get_current_admin)
 ):
     """Get total payment amount per user"""
     return AdminService.get_user_payment_totals(db, page, limit, sort_desc)
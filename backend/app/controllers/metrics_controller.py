@@ -0,0 +1,33 @@
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+from app.config import get_settings
+from app.middleware.auth_middleware import get_current_principal
+from app.services.metrics import metrics
+
+settings = get_settings()
+router = APIRouter(tags=["Metrics"])
+
+
+def require_metrics_access(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """Bearer METRICS_TOKEN (Prometheus scrape) hoặc access token của admin"""
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    if settings.METRICS_TOKEN and hmac.compare_digest(
+        credentials.credentials.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        return
+    if not get_current_principal(credentials).is_admin:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+def get_metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, queue depth, cache hit ratio"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
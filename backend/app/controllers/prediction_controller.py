@@ -1,50 +1,193 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
 from sqlalchemy.orm import Session
+from typing import Any, AsyncIterator, Coroutine, Dict, List, Optional
+import asyncio
+import re
 import time
 import logging
-import json
 
 from app.database import get_db
+from app.config import get_settings
 from app.services.subscription_service import SubscriptionService
-from app.services.ml_inference_service import MLInferenceService
-from app.repositories.usage_log_repository import UsageLogRepository
-from app.schemas.prediction import PredictionResponse
+from app.services.inference_executor import InferenceOverloadedError
+from app.services.image_fetcher import ImageFetchError, image_fetcher
+from app.services.model_manager import model_manager, ModelState
+from app.services.metrics import PREDICT_STAGE_SECONDS
+from app.services.rgb_payload import rgb_payload_size, rgb_payload_to_array
+from app.services.upload_reader import UploadReader, UploadRejectedError, iter_multipart_file, iter_upload
+from app.services.usage_log_writer import prediction_outcome, usage_log_writer
+from app.schemas.prediction import (
+    PredictionResponse, UrlPredictionRequest, BatchPredictionItem, BatchPredictionResponse
+)
 from app.middleware.auth_middleware import get_current_user_id, get_optional_user_id
 
 router = APIRouter(prefix="/api/v1", tags=["Prediction"])
-
-# Initialize ML service (singleton)
-ml_service = MLInferenceService()
+settings = get_settings()
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+CONTENT_HASH_PATTERN = re.compile(r"^[0-9a-fA-F]{32}$")
+
+
+def _require_model_ready():
+    """Fail fast with 503 while the model is still loading in the background"""
+    if model_manager.is_ready:
+        return
+    if model_manager.state == ModelState.FAILED:
+        raise HTTPException(status_code=503, detail="Model failed to load")
+    raise HTTPException(
+        status_code=503,
+        detail="Model is loading, please retry shortly",
+        headers={"Retry-After": str(settings.MODEL_NOT_READY_RETRY_AFTER)}
+    )
+
+
+def _validate_threshold(threshold: float):
+    if threshold <= 0.0 or threshold >= 1.0:
+        raise HTTPException(status_code=400, detail="Threshold must be in (0, 1)")
+
+
+def _reserve_quota(
+    subscription_service: SubscriptionService, user_id: int, count: int = 1, partial: bool = False
+) -> Dict:
+    """Atomically reserve quota before inference (403 when nothing can be reserved)"""
+    with PREDICT_STAGE_SECONDS.time(stage="quota_reserve"):
+        reservation = subscription_service.reserve_quota(user_id, count, partial=partial)
+    
+    if not reservation["allowed"]:
+        raise HTTPException(status_code=403, detail=reservation["reason"])
+    return reservation
+
+
+def _release_quota(subscription_service: SubscriptionService, reservation: Dict, count: int):
+    """Give back reserved units that were not used (failed or cancelled inference)"""
+    if count > 0:
+        with PREDICT_STAGE_SECONDS.time(stage="quota_release"):
+            subscription_service.release_quota(reservation["subscription_id"], count)
+
 
-@router.post("/predict", response_model=PredictionResponse)
+def _prediction_error(e: Exception, source: str) -> HTTPException:
+    """Map an inference failure to the HTTP error returned to the client"""
+    if isinstance(e, ImageFetchError):
+        logger.warning(f"Image fetch failed for {source}: {e}")
+        return HTTPException(status_code=e.status_code, detail=str(e))
+    if isinstance(e, InferenceOverloadedError):
+        logger.warning(f"Inference overloaded: queue depth {model_manager.batcher.queue_depth}")
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if isinstance(e, ValueError):
+        logger.warning(f"Invalid image format: {e}, {source}")
+        return HTTPException(status_code=400, detail=str(e))
+    logger.error(f"Inference failed: {e}")
+    return HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
+
+
+async def _complete_prediction(
+    job: Coroutine[Any, Any, List[float]],
+    threshold: float,
+    subscription_service: SubscriptionService,
+    user_id: int,
+    endpoint: str,
+    source: str,
+) -> PredictionResponse:
+    """
+    Reserve one unit of quota, await inference, then log usage; `source` describes the input for error logs
+    The reservation is released if inference fails or the client disconnects.
+    """
+    try:
+        reservation = _reserve_quota(subscription_service, user_id)
+    except BaseException:
+        job.close()  # Never started: no inference when quota can't be reserved (402, DB error, cancellation)
+        raise
+    start_time = time.time()
+    try:
+        probabilities = await job
+        result = model_manager.ml_service.build_result(probabilities, threshold)
+    except BaseException as e:
+        _release_quota(subscription_service, reservation, 1)
+        if isinstance(e, Exception):
+            raise _prediction_error(e, source)
+        raise
+    
+    response_time = (time.time() - start_time) * 1000  # ms
+    PREDICT_STAGE_SECONDS.observe(response_time / 1000, stage="inference")
+    
+    # Log usage (write-behind, flushed in batches by a background task)
+    with PREDICT_STAGE_SECONDS.time(stage="usage_log_write"):
+        usage_log_writer.submit(
+            user_id=user_id,
+            endpoint=endpoint,
+            method="POST",
+            status_code=200,
+            response_time_ms=response_time,
+            **prediction_outcome(
+                result["classes"], result["probabilities"], result["active"], model_manager.ml_service.model_version
+            )
+        )
+    
+    # Return result with remaining quota
+    return PredictionResponse(
+        classes=result["classes"],
+        probabilities=result["probabilities"],
+        active=result["active"],
+        quota_remaining=reservation["remaining"]
+    )
+
+
+# Decode reads the returned memoryview in place; header sniffing rejects non-images / oversized images early
+image_reader = UploadReader(settings.UPLOAD_MAX_BYTES, settings.MODEL_MAX_IMAGE_PIXELS)
+
+
+def _declared_length(request: Request) -> Optional[int]:
+    declared = request.headers.get("content-length")
+    return int(declared) if declared is not None and declared.isdigit() else None
+
+
+async def _read_upload(reader: UploadReader, chunks: AsyncIterator[bytes], expected_size: Optional[int]) -> memoryview:
+    """Stream an upload through the reader, mapping rejections to HTTP errors"""
+    try:
+        with PREDICT_STAGE_SECONDS.time(stage="upload_read"):
+            return await reader.read(chunks, expected_size)
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+# The multipart body is parsed in the handler (not as an UploadFile parameter), so the image header is
+# sniffed from the first chunk of the stream instead of after Starlette has spooled the whole upload
+MULTIPART_FILE_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("/predict", response_model=PredictionResponse, openapi_extra=MULTIPART_FILE_BODY)
 async def predict(
-    file: UploadFile = File(...),
+    request: Request,
     threshold: float = 0.5,
     db: Session = Depends(get_db),
     user_id: int = Depends(get_current_user_id)
 ):
     """Predict dangerous objects in image (requires authentication and quota)"""
-    
-    # Check quota
+    _require_model_ready()
+    _validate_threshold(threshold)
     subscription_service = SubscriptionService(db)
-    quota_check = subscription_service.check_quota(user_id)
-    
-    if not quota_check["allowed"]:
-        raise HTTPException(status_code=403, detail=quota_check["reason"])
-    
-    # Validate threshold
-    if threshold <= 0.0 or threshold >= 1.0:
-        raise HTTPException(status_code=400, detail="Threshold must be in (0, 1)")
     
     # Read image
     try:
-        image_bytes = await file.read()
-        if not image_bytes or len(image_bytes) < 100:
-            logger.warning(f"Empty or too small image received: {len(image_bytes) if image_bytes else 0} bytes")
+        chunks = iter_multipart_file(request.stream(), request.headers.get("content-type", ""), "file")
+        image_bytes = await _read_upload(image_reader, chunks, None)
+        if len(image_bytes) < 100:
+            logger.warning(f"Empty or too small image received: {len(image_bytes)} bytes")
             raise HTTPException(status_code=400, detail="Empty or invalid image file")
     except HTTPException:
         raise
@@ -52,40 +195,234 @@ async def predict(
         logger.error(f"Failed to read image: {e}")
         raise HTTPException(status_code=400, detail="Failed to read image")
     
-    # Perform inference
-    start_time = time.time()
+    return await _complete_prediction(
+        model_manager.pipeline.get_probabilities(image_bytes), threshold, subscription_service, user_id, "/api/v1/predict", f"size: {len(image_bytes)} bytes"
+    )
+
+
+@router.post("/predict/raw", response_model=PredictionResponse)
+async def predict_raw(
+    request: Request,
+    threshold: float = 0.5,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Predict an encoded image sent as the raw request body (Content-Type: application/octet-stream)
+    Same result as /predict without the multipart parsing cost.
+    """
+    _require_model_ready()
+    _validate_threshold(threshold)
+    subscription_service = SubscriptionService(db)
+    
+    image_bytes = await _read_upload(image_reader, request.stream(), _declared_length(request))
+    if len(image_bytes) < 100:
+        raise HTTPException(status_code=400, detail="Empty or invalid image file")
+    
+    return await _complete_prediction(
+        model_manager.pipeline.get_probabilities(image_bytes), threshold, subscription_service, user_id, "/api/v1/predict/raw", f"size: {len(image_bytes)} bytes"
+    )
+
+
+@router.post("/predict/rgb", response_model=PredictionResponse)
+async def predict_rgb(
+    request: Request,
+    threshold: float = 0.5,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Predict a client-side pre-resized image: the body is exactly MODEL_IMG_SIZE x MODEL_IMG_SIZE RGB
+    pixels, uint8, row-major (HWC), as produced by canvas getImageData without the alpha channel.
+    Skips image decode and resize entirely.
+    """
+    _require_model_ready()
+    _validate_threshold(threshold)
+    subscription_service = SubscriptionService(db)
+    
+    expected = rgb_payload_size(settings.MODEL_IMG_SIZE)
+    payload = await _read_upload(UploadReader(expected), request.stream(), _declared_length(request))
     try:
-        result = ml_service.predict(image_bytes, threshold)
+        pixels = rgb_payload_to_array(payload, settings.MODEL_IMG_SIZE)
     except ValueError as e:
-        logger.warning(f"Invalid image format: {e}, size: {len(image_bytes)} bytes")
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Inference failed: {e}")
-        raise HTTPException(status_code=500, detail=f"Inference failed: {str(e)}")
-    
-    response_time = (time.time() - start_time) * 1000  # ms
     
-    # Increment usage
-    subscription_service.increment_usage(quota_check["subscription_id"])
-    
-    # Log usage
-    usage_log_repo = UsageLogRepository(db)
-    usage_log_repo.create(
-        user_id=user_id,
-        endpoint="/api/v1/predict",
-        method="POST",
-        status_code=200,
-        response_time_ms=response_time,
-        meta_data=json.dumps({"blocked": not result["active"], "classes": result["classes"]})
+    return await _complete_prediction(
+        model_manager.pipeline.get_probabilities(pixels), threshold, subscription_service, user_id, "/api/v1/predict/rgb", "pre-resized RGB payload"
     )
+
+
+@router.post("/predict/url", response_model=PredictionResponse)
+async def predict_url(
+    request: UrlPredictionRequest,
+    threshold: float = 0.5,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Predict an image by URL: the server fetches it (no CORS / canvas limits on the client)
+    Results are cached per URL, so an image seen by any user is fetched and classified once.
+    """
+    _require_model_ready()
+    _validate_threshold(threshold)
+    subscription_service = SubscriptionService(db)
     
-    # Return result with remaining quota
-    return PredictionResponse(
-        classes=result["classes"],
-        probabilities=result["probabilities"],
-        active=result["active"],
-        quota_remaining=quota_check["remaining"] - 1
+    # Fetch (or reuse the cached result for this URL) and perform inference
+    return await _complete_prediction(
+        model_manager.pipeline.get_probabilities_for_url(request.url, image_fetcher), threshold, subscription_service, user_id, "/api/v1/predict/url", f"url: {request.url[:200]}"
     )
 
 
+def _fill_batch_item(item: BatchPredictionItem, probabilities: List[float], threshold: float):
+    result = model_manager.ml_service.build_result(probabilities, threshold)
+    item.classes = result["classes"]
+    item.probabilities = result["probabilities"]
+    item.active = result["active"]
+
 
+async def _prepare_batch_item(item: BatchPredictionItem, source, threshold: float):
+    """Read an upload (returns its inference job) or serve a content hash from cache; errors go on the item"""
+    if isinstance(source, str):
+        if not CONTENT_HASH_PATTERN.match(source):
+            item.error = "Invalid content hash"
+            return None
+        probabilities = await model_manager.pipeline.get_cached_probabilities(source)
+        if probabilities is None:
+            item.error = "Unknown content hash, upload the image instead"
+            return None
+        _fill_batch_item(item, probabilities, threshold)
+        return None
+    
+    try:
+        with PREDICT_STAGE_SECONDS.time(stage="upload_read"):
+            image_bytes = await image_reader.read(iter_upload(source), source.size)
+    except UploadRejectedError as e:
+        item.error = str(e)
+        return None
+    except Exception as e:
+        logger.error(f"Failed to read image #{item.index}: {e}")
+        item.error = "Failed to read image"
+        return None
+    if len(image_bytes) < 100:
+        item.error = "Empty or invalid image file"
+        return None
+    return model_manager.pipeline.get_probabilities(image_bytes)
+
+
+async def _run_batch(
+    files: List[UploadFile], hashes: List[str], allowed_count: int, threshold: float
+) -> List[BatchPredictionItem]:
+    """
+    Read, look up and infer every batch item; errors are recorded per item
+    Only successful items use up the allowed count: slots of items that fail (read / decode / inference)
+    go to the next items, in waves whose uploads are inferred concurrently so they share forward passes.
+    """
+    results = [BatchPredictionItem(index=index, filename=upload.filename) for index, upload in enumerate(files)]
+    results += [
+        BatchPredictionItem(index=len(files) + offset, content_hash=content_hash)
+        for offset, content_hash in enumerate(hashes)
+    ]
+    candidates = list(zip(results, list(files) + list(hashes)))
+    slots = allowed_count
+    
+    while candidates and slots > 0:
+        pending = []
+        try:
+            while candidates and len(pending) < slots:
+                item, source = candidates.pop(0)
+                job = await _prepare_batch_item(item, source, threshold)
+                if job is not None:
+                    pending.append((item, job))
+                elif item.error is None:
+                    slots -= 1  # Served from cache
+        except BaseException:
+            for _, job in pending:
+                job.close()  # Not started yet
+            raise
+        
+        outcomes = await asyncio.gather(*(job for _, job in pending), return_exceptions=True)
+        for (item, _), outcome in zip(pending, outcomes):
+            if isinstance(outcome, InferenceOverloadedError):
+                item.error = "Inference queue is full, retry later"
+            elif isinstance(outcome, ValueError):
+                item.error = str(outcome)
+            elif isinstance(outcome, Exception):
+                logger.error(f"Inference failed for batch item #{item.index}: {outcome}")
+                item.error = "Inference failed"
+            else:
+                _fill_batch_item(item, outcome, threshold)
+                slots -= 1
+    
+    for item, _ in candidates:
+        item.error = "Quota exceeded"
+    return results
+
+
+@router.post("/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(
+    files: List[UploadFile] = File(default=[]),
+    hashes: List[str] = Form(default=[]),
+    threshold: float = 0.5,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """
+    Predict many images in one request (requires authentication and quota)
+    - files: image uploads, inferred together through the batching engine
+    - hashes: content hashes (blake2b-128 hex) of images already classified, served from cache
+    Errors are reported per item; only successful items consume quota.
+    """
+    _require_model_ready()
+    
+    total = len(files) + len(hashes)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if total > settings.PREDICT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images in one batch (max {settings.PREDICT_BATCH_MAX_ITEMS})"
+        )
+    
+    _validate_threshold(threshold)
+    
+    # Reserve quota once for the whole batch; items beyond the reserved count are rejected
+    subscription_service = SubscriptionService(db)
+    reservation = _reserve_quota(subscription_service, user_id, total, partial=True)
+    
+    start_time = time.time()
+    try:
+        results = await _run_batch(files, hashes, reservation["reserved"], threshold)
+    except BaseException:
+        _release_quota(subscription_service, reservation, reservation["reserved"])
+        raise
+    
+    response_time = (time.time() - start_time) * 1000  # ms
+    PREDICT_STAGE_SECONDS.observe(response_time / 1000, stage="inference")
+    processed = [item for item in results if item.error is None]
+    
+    # Only successful items consume quota
+    unused = reservation["reserved"] - len(processed)
+    _release_quota(subscription_service, reservation, unused)
+    
+    if processed:
+        # Log usage (one row per image, write-behind)
+        model_version = model_manager.ml_service.model_version
+        with PREDICT_STAGE_SECONDS.time(stage="usage_log_write"):
+            usage_log_writer.submit_many([
+                {
+                    "user_id": user_id,
+                    "endpoint": "/api/v1/predict/batch",
+                    "method": "POST",
+                    "status_code": 200,
+                    "response_time_ms": response_time,
+                    **prediction_outcome(item.classes, item.probabilities, item.active, model_version),
+                }
+                for item in processed
+            ])
+    
+    return BatchPredictionResponse(
+        results=results,
+        processed=len(processed),
+        failed=total - len(processed),
+        quota_remaining=reservation["remaining"] + unused
+    )
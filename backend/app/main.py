@@ -1,5 +1,6 @@
 import logging
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
@@ -8,15 +9,29 @@ from pathlib import Path
 from app.config import get_settings
 from app.database import init_db
 from app.api import api_router
+from app.middleware.upload_limit_middleware import UploadLimitMiddleware
+from app.services.model_manager import model_manager
+from app.services.image_fetcher import image_fetcher
+from app.services.usage_log_writer import usage_log_writer
 
 settings = get_settings()
 
+# Multipart boundaries / headers / form fields on top of the image bytes
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup"""
+    """
+    Initialize database, then load the model in the background
+    On shutdown: stop inference workers and flush buffered usage logs
+    """
     init_db()
+    model_manager.start()
     yield
+    await model_manager.stop()
+    await image_fetcher.aclose()
+    await usage_log_writer.stop()
 
 
 app = FastAPI(
@@ -25,6 +40,20 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+def upload_limit_for(path: str):
+    """Body size cap per upload endpoint (None = not an upload endpoint)"""
+    if path == "/api/v1/predict/batch":
+        return settings.UPLOAD_MAX_BYTES * settings.PREDICT_BATCH_MAX_ITEMS + MULTIPART_OVERHEAD_BYTES
+    if path.startswith("/api/v1/predict"):
+        return settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+    return None
+
+
+# Reject oversized uploads while they stream in, before multipart parsing buffers them
+# (added before CORS so CORS stays outermost and early 413s still carry CORS headers)
+app.add_middleware(UploadLimitMiddleware, limit_for=upload_limit_for)
+
 # CORS middleware - Allow Chrome Extension access
 app.add_middleware(
     CORSMiddleware,
@@ -56,6 +85,8 @@ def root():
             "payment": "/api/payment",
             "subscription": "/api/subscription",
             "prediction": "/api/v1",
+            "metrics": "/metrics",
+            "ready": "/ready",
             "docs": "/docs"
         }
     }
@@ -63,9 +94,18 @@ def root():
 
 @app.get("/health")
 def health():
-    """Health check endpoint"""
+    """Health check endpoint (process is up, model may still be loading)"""
     return {"status": "ok"}
 
+
+@app.get("/ready")
+def ready():
+    """Readiness check: 200 once the model is loaded and warm, 503 before that"""
+    status = model_manager.status()
+    if not model_manager.is_ready:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
 # Serve static callback/payment pages for dev flows (kept outside backend code)
 if settings.DEBUG:
     repo_root = Path(__file__).resolve().parents[2]
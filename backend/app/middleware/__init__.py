@@ -1,6 +1,4 @@
-from app.middleware.auth_middleware import get_current_user_id
-
-__all__ = ["get_current_user_id"]
-
-
+from app.middleware.auth_middleware import get_current_principal, get_current_user_id
+from app.middleware.upload_limit_middleware import UploadLimitMiddleware
 
+__all__ = ["get_current_principal", "get_current_user_id", "UploadLimitMiddleware"]
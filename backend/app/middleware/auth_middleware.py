@@ -1,41 +1,65 @@
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
 from typing import Optional
 
-from app.database import get_db
-from app.services.auth_service import AuthService
+from app.database import SessionLocal
+from app.repositories.user_repository import UserRepository
+from app.services.auth_service import decode_access_token
+from app.services.metrics import AUTH_SECONDS
+from app.services.principal_cache import Principal, principal_cache
 
 security = HTTPBearer()
 
 
-def get_current_user_id(
-    credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db)
-) -> int:
-    """Extract and validate JWT token, return user_id"""
+def _load_principal(user_id: int) -> Optional[Principal]:
+    """Cache miss: đọc cờ active / admin của user bằng session ngắn (không giữ suốt request)"""
+    db = SessionLocal()
+    try:
+        user = UserRepository(db).get_by_id(user_id)
+        if not user:
+            return None
+        return Principal(user_id=user.id, is_active=bool(user.is_active), is_admin=bool(user.is_admin))
+    finally:
+        db.close()
+
+
+def get_current_principal(credentials: HTTPAuthorizationCredentials = Security(security)) -> Principal:
+    """
+    Validate the bearer token and return the verified principal
+    Cached per token (AUTH_PRINCIPAL_CACHE_TTL_SECONDS), so the common path opens no DB session.
+    Disabled accounts get 403 on every authenticated endpoint.
+    """
     token = credentials.credentials
     
-    auth_service = AuthService(db)
-    user_id = auth_service.decode_token(token)
+    with AUTH_SECONDS.time():
+        principal = principal_cache.get(token)
+        if principal is None:
+            decoded = decode_access_token(token)
+            if decoded is None:
+                raise HTTPException(status_code=401, detail="Invalid or expired token")
+            user_id, expires_at = decoded
+            principal = _load_principal(user_id)
+            if principal is None:
+                raise HTTPException(status_code=401, detail="Invalid or expired token")
+            principal_cache.put(token, principal, expires_at)
     
-    if user_id is None:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if not principal.is_active:
+        raise HTTPException(status_code=403, detail="Account is disabled")
     
-    return user_id
+    return principal
+
+
+def get_current_user_id(principal: Principal = Depends(get_current_principal)) -> int:
+    """Extract and validate JWT token, return user_id"""
+    return principal.user_id
 
 
 def get_optional_user_id(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
 ) -> Optional[int]:
     """Extract user_id if token provided, otherwise return None"""
     if not credentials:
         return None
     
-    token = credentials.credentials
-    auth_service = AuthService(db)
-    return auth_service.decode_token(token)
-
-
-
+    decoded = decode_access_token(credentials.credentials)
+    return decoded[0] if decoded else None
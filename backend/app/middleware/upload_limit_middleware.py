@@ -0,0 +1,48 @@
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class UploadLimitMiddleware:
+    """
+    Giới hạn kích thước body của các endpoint upload ngay khi đang nhận (trước khi Starlette parse
+    multipart và spool file ra đĩa)
+    - Content-Length vượt giới hạn -> 413 mà không đọc body
+    - Chunked / khai báo sai -> đếm byte khi nhận, vượt giới hạn -> 413 và dừng đọc
+    limit_for(path) trả về số byte tối đa, None = không giới hạn
+    """
+
+    def __init__(self, app: ASGIApp, limit_for: Callable[[str], Optional[int]]):
+        self.app = app
+        self.limit_for = limit_for
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+        limit = self.limit_for(scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body too large (max {limit} bytes)"
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI / Starlette chuyển HTTPException này thành response 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -8,14 +8,28 @@ class UsageLog(Base):
     __tablename__ = "usage_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     endpoint = Column(String, nullable=False)  # e.g., "/v1/predict"
     method = Column(String, nullable=False)  # e.g., "POST"
     status_code = Column(Integer, nullable=True)
     response_time_ms = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
     meta_data = Column(String, nullable=True) # JSON string for flexibility
     
+    # Prediction outcome (NULL for non-predict rows)
+    blocked = Column(Boolean, nullable=True)  # No active class at the request threshold
+    active_mask = Column(Integer, nullable=True)  # Bit i = MODEL_CLASSES[i] active
+    probabilities_q = Column(LargeBinary, nullable=True)  # 1 byte per class, round(p * 255)
+    model_version = Column(String, nullable=True)
+    
+    # (user_id, created_at): per-user stats; (created_at, blocked): stats by time range;
+    # (blocked, created_at): global blocked counts, all-time or since a date
+    __table_args__ = (
+        Index("ix_usage_logs_user_id_created_at", "user_id", "created_at"),
+        Index("ix_usage_logs_created_at_blocked", "created_at", "blocked"),
+        Index("ix_usage_logs_blocked_created_at", "blocked", "created_at"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="usage_logs")
 
@@ -1,3 +1,4 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.models.subscription import Subscription, PlanType, SubscriptionStatus
 from typing import Optional, List
@@ -44,13 +45,42 @@ class SubscriptionRepository:
             Subscription.user_id == user_id
         ).order_by(Subscription.created_at.desc()).all()
     
-    def increment_usage(self, subscription_id: int, count: int = 1) -> Optional[Subscription]:
-        subscription = self.get_by_id(subscription_id)
-        if subscription:
-            subscription.used_quota += count
-            self.db.commit()
-            self.db.refresh(subscription)
-        return subscription
+    def reserve_quota(self, subscription_id: int, count: int = 1) -> Optional[int]:
+        """
+        Atomically consume `count` units if they fit in the monthly quota (one conditional UPDATE)
+        Returns the remaining quota after the reservation, None if the quota is insufficient
+        or the subscription is no longer active.
+        """
+        remaining = self.db.execute(
+            update(Subscription)
+            .where(
+                Subscription.id == subscription_id,
+                Subscription.status.in_((SubscriptionStatus.ACTIVE, SubscriptionStatus.CANCELLED)),
+                Subscription.used_quota + count <= Subscription.monthly_quota
+            )
+            .values(used_quota=Subscription.used_quota + count)
+            .returning(Subscription.monthly_quota - Subscription.used_quota)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        self.db.commit()
+        return remaining
+    
+    def release_quota(self, subscription_id: int, count: int = 1) -> int:
+        """Give back reserved units that were not used; returns the number of rows updated"""
+        result = self.db.execute(
+            update(Subscription)
+            .where(Subscription.id == subscription_id, Subscription.used_quota >= count)
+            .values(used_quota=Subscription.used_quota - count)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        return result.rowcount
+    
+    def get_remaining_quota(self, subscription_id: int) -> int:
+        remaining = self.db.query(
+            Subscription.monthly_quota - Subscription.used_quota
+        ).filter(Subscription.id == subscription_id).scalar()
+        return max(remaining or 0, 0)
     
     def reset_usage(self, subscription_id: int) -> Optional[Subscription]:
         subscription = self.get_by_id(subscription_id)
@@ -1,6 +1,7 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from app.models.usage_log import UsageLog
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 
 
@@ -30,6 +31,14 @@ class UsageLogRepository:
         self.db.refresh(log)
         return log
     
+    def create_many(self, logs: List[Dict]) -> int:
+        """Insert nhiều usage log bằng 1 lệnh bulk insert / 1 transaction (không dựng ORM object)"""
+        if not logs:
+            return 0
+        self.db.execute(insert(UsageLog), logs)
+        self.db.commit()
+        return len(logs)
+    
     def get_by_user(self, user_id: int, limit: int = 100) -> List[UsageLog]:
         return self.db.query(UsageLog).filter(
             UsageLog.user_id == user_id
@@ -54,12 +63,12 @@ class UsageLogRepository:
         return self.db.query(UsageLog).filter(
             UsageLog.user_id == user_id,
             UsageLog.created_at >= start_date,
-            UsageLog.meta_data.like('%"blocked": true%')
+            UsageLog.blocked == True
         ).count()
 
     def count_total_blocked(self, user_id: int) -> int:
         return self.db.query(UsageLog).filter(
             UsageLog.user_id == user_id,
-            UsageLog.meta_data.like('%"blocked": true%')
+            UsageLog.blocked == True
         ).count()
 
@@ -15,6 +15,9 @@ __all__ = [
     "MoMoIPNRequest",
     "PredictionRequest",
     "PredictionResponse",
+    "UrlPredictionRequest",
+    "BatchPredictionItem",
+    "BatchPredictionResponse",
     "SubscriptionResponse",
     "PurchasePlanRequest",
     "ApiResponse",
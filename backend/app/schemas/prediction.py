@@ -1,11 +1,15 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 
 
 class PredictionRequest(BaseModel):
     threshold: float = 0.5
 
 
+class UrlPredictionRequest(BaseModel):
+    url: str = Field(..., min_length=1, max_length=4096)
+
+
 class PredictionResponse(BaseModel):
     classes: List[str]
     probabilities: List[float]
@@ -13,4 +17,18 @@ class PredictionResponse(BaseModel):
     quota_remaining: int
 
 
+class BatchPredictionItem(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    content_hash: Optional[str] = None
+    classes: Optional[List[str]] = None
+    probabilities: Optional[List[float]] = None
+    active: Optional[List[str]] = None
+    error: Optional[str] = None
 
+
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+    processed: int
+    failed: int
+    quota_remaining: int
@@ -1,9 +1,16 @@
 from app.services.auth_service import AuthService
 from app.services.payment_service import PaymentService
 from app.services.subscription_service import SubscriptionService
-from app.services.ml_inference_service import MLInferenceService
 from app.services.user_service import UserService
 
 __all__ = ["AuthService", "PaymentService", "SubscriptionService", "MLInferenceService", "UserService"]
 
 
+def __getattr__(name):
+    # MLInferenceService kéo theo torch/torchvision: chỉ import khi thực sự dùng
+    if name == "MLInferenceService":
+        from app.services.ml_inference_service import MLInferenceService
+        return MLInferenceService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
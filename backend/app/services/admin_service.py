@@ -15,6 +15,8 @@ from app.schemas.admin import (
 )
 from app.models.transaction import Transaction, TransactionStatus, TransactionType
 from app.models.system_setting import SystemSetting
+from app.services.principal_cache import principal_cache
+from app.services.subscription_cache import subscription_cache
 import json
 
 # Mock Data Store for Reports (In-memory for demo purposes)
@@ -53,12 +55,10 @@ class AdminService:
             func.date(UsageLog.created_at) == today
         ).distinct().count()
         
-        # Real count: blocked content from usage_logs meta_data
-        # Check for "blocked": true or "blocked":true patterns
-        content_blocked = db.query(UsageLog).filter(
-            (UsageLog.meta_data.like('%"blocked": true%')) | 
-            (UsageLog.meta_data.like('%"blocked":true%'))
-        ).count()
+        # Real count: blocked content from the indexed usage_logs.blocked column
+        content_blocked = db.query(func.count(UsageLog.id)).filter(
+            UsageLog.blocked == True
+        ).scalar()
         
         # Calculate total revenue
         total_revenue = db.query(func.sum(Transaction.amount)).filter(
@@ -263,6 +263,8 @@ class AdminService:
             
         db.commit()
         db.refresh(user)
+        subscription_cache.invalidate(user_id)
+        principal_cache.invalidate_user(user_id)
         return {"success": True, "message": "User updated successfully"}
 
     @staticmethod
@@ -278,6 +280,8 @@ class AdminService:
         # Delete the user
         db.delete(user)
         db.commit()
+        subscription_cache.invalidate(user_id)
+        principal_cache.invalidate_user(user_id)
         
         return {"success": True, "message": "User deleted successfully"}
 
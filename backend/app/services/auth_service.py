@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 import httpx
@@ -15,6 +15,18 @@ from app.models.subscription import PlanType
 settings = get_settings()
 
 
+def decode_access_token(token: str) -> Optional[Tuple[int, Optional[int]]]:
+    """Xác thực chữ ký / hạn JWT (không cần DB), trả về (user_id, exp) hoặc None"""
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+        user_id: str = payload.get("sub")
+        if user_id is None:
+            return None
+        return int(user_id), payload.get("exp")
+    except (JWTError, ValueError):
+        return None
+
+
 class AuthService:
     """Service xử lý authentication (đăng ký, đăng nhập, JWT)"""
     
@@ -50,14 +62,8 @@ class AuthService:
     
     def decode_token(self, token: str) -> Optional[int]:
         """Giải mã JWT token và trả về user_id"""
-        try:
-            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-            user_id: str = payload.get("sub")
-            if user_id is None:
-                return None
-            return int(user_id)
-        except JWTError:
-            return None
+        decoded = decode_access_token(token)
+        return decoded[0] if decoded else None
     
     def register(self, email: str, password: str, name: Optional[str] = None) -> User:
         """Đăng ký user mới với email/password và tạo gói FREE"""
@@ -0,0 +1,95 @@
+import random
+import threading
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.services.metrics import CASCADE_IMAGES
+from app.services.preprocessing import BatchPreprocessor
+
+settings = get_settings()
+
+# So sánh first pass với full model theo threshold mặc định của /predict
+AGREEMENT_THRESHOLD = 0.5
+
+
+class InferenceCascade:
+    """
+    Cascade 2 tầng cho MLInferenceService: chạy model ở độ phân giải thấp (first_pass_size) trước,
+    chỉ ảnh có probability nằm trong vùng không chắc chắn [band_low, band_high] mới chạy lại full model
+    - MobileNetV2 fully-convolutional + global pooling nên dùng chung weights ở input nhỏ hơn
+      (128x128 ~ 1/3 FLOPs của 224x224)
+    - audit_rate: tỉ lệ ảnh được first pass chấp nhận vẫn chạy full model để đo mức đồng thuận
+    - Thống kê: tỉ lệ escalate, thời gian tiết kiệm ước tính, tỉ lệ đồng thuận với full model
+    """
+
+    def __init__(
+        self,
+        first_pass_size: Optional[int] = None,
+        band_low: Optional[float] = None,
+        band_high: Optional[float] = None,
+        audit_rate: Optional[float] = None,
+    ):
+        self.first_pass_size = first_pass_size or settings.CASCADE_FIRST_PASS_SIZE
+        self.band_low = band_low if band_low is not None else settings.CASCADE_BAND_LOW
+        self.band_high = band_high if band_high is not None else settings.CASCADE_BAND_HIGH
+        self.audit_rate = audit_rate if audit_rate is not None else settings.CASCADE_AUDIT_SAMPLE_RATE
+        self.preprocessor = BatchPreprocessor(
+            self.first_pass_size, initial_batch_size=settings.INFERENCE_BATCH_MAX_SIZE
+        )
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+        self.first_pass_seconds = 0.0
+        self.full_images = 0
+        self.full_seconds = 0.0
+        self.audits = 0
+        self.agreements = 0
+
+    def needs_full_model(self, probabilities: List[float]) -> bool:
+        return any(self.band_low <= prob <= self.band_high for prob in probabilities)
+
+    def should_audit(self) -> bool:
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def record_batch(self, images: int, escalated: int, first_pass_s: float, full_images: int, full_s: float):
+        CASCADE_IMAGES.inc(images - escalated, stage="accepted")
+        CASCADE_IMAGES.inc(escalated, stage="escalated")
+        with self._lock:
+            self.images += images
+            self.escalated += escalated
+            self.first_pass_seconds += first_pass_s
+            self.full_images += full_images
+            self.full_seconds += full_s
+
+    def record_audit(self, first_pass: List[float], full: List[float]):
+        agree = [p >= AGREEMENT_THRESHOLD for p in first_pass] == [p >= AGREEMENT_THRESHOLD for p in full]
+        with self._lock:
+            self.audits += 1
+            self.agreements += agree
+
+    @property
+    def escalation_ratio(self) -> float:
+        return self.escalated / self.images if self.images else 0.0
+
+    @property
+    def agreement_ratio(self) -> float:
+        return self.agreements / self.audits if self.audits else 0.0
+
+    @property
+    def seconds_saved(self) -> float:
+        """Ước tính: ảnh được chấp nhận x chi phí full model / ảnh, trừ chi phí first pass của mọi ảnh"""
+        if not self.full_images:
+            return 0.0
+        full_per_image = self.full_seconds / self.full_images
+        return (self.images - self.escalated) * full_per_image - self.first_pass_seconds
+
+    def stats(self) -> Dict:
+        return {
+            "first_pass_size": self.first_pass_size,
+            "images": self.images,
+            "escalated": self.escalated,
+            "escalation_ratio": self.escalation_ratio,
+            "seconds_saved": self.seconds_saved,
+            "audits": self.audits,
+            "agreement_ratio": self.agreement_ratio,
+        }
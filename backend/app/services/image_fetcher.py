@@ -0,0 +1,193 @@
+import asyncio
+import ipaddress
+import socket
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urldefrag, urljoin, urlsplit
+
+import httpcore
+import httpx
+
+from app.config import get_settings
+
+settings = get_settings()
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class ImageFetchError(Exception):
+    """Không lấy được ảnh từ URL; status_code là mã HTTP nên trả cho client"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def normalize_url(url: str) -> str:
+    """Bỏ fragment (#...) và khoảng trắng: cùng 1 ảnh thì cùng key cache / single-flight"""
+    return urldefrag(url.strip())[0]
+
+
+async def resolve_host(host: str, port: int) -> List[str]:
+    """Các địa chỉ IP của host (theo thứ tự getaddrinfo, không trùng)"""
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ImageFetchError("Could not resolve image host", status_code=502)
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+
+def is_public_address(address: str) -> bool:
+    return ipaddress.ip_address(address.split("%", 1)[0]).is_global
+
+
+class PinnedNetworkBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend của httpcore: resolve host 1 lần, kiểm tra mọi địa chỉ rồi connect thẳng tới IP đã kiểm tra
+    - httpx không resolve lại host -> DNS rebinding (lần resolve thứ 2 trả IP nội bộ) không lọt qua
+    - Host header và SNI / kiểm tra certificate vẫn dùng hostname gốc (httpcore lấy từ URL, không từ socket)
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, allow_private_hosts: bool = False):
+        self._backend = backend
+        self.allow_private_hosts = allow_private_hosts
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        addresses = await resolve_host(host, port)
+        if not self.allow_private_hosts and not all(is_public_address(address) for address in addresses):
+            raise ImageFetchError("Image host is not allowed")
+        error = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(
+                    address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except httpcore.ConnectError as e:
+                error = e  # Thử địa chỉ kế tiếp của cùng host (vd IPv6 không route được)
+        raise error
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        raise ImageFetchError("Image host is not allowed")
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+
+class ImageFetcher:
+    """
+    Tải ảnh từ URL cho /api/v1/predict/url qua 1 httpx.AsyncClient dùng chung (connection pool, keep-alive)
+    - Giới hạn số request đồng thời tới mỗi host (không dồn tải vào 1 CDN) và tổng số connection
+    - Giới hạn kích thước (đọc stream, dừng khi vượt) và thời gian cho cả lần tải (kể cả redirect)
+    - Chặn host nội bộ (loopback / private / link-local) để tránh SSRF, trừ khi URL_FETCH_ALLOW_PRIVATE_HOSTS:
+      kiểm tra lúc mở connection, trên đúng các IP được connect (PinnedNetworkBackend)
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        timeout_s: Optional[float] = None,
+        per_host_limit: Optional[int] = None,
+        max_connections: Optional[int] = None,
+        max_redirects: Optional[int] = None,
+        allow_private_hosts: Optional[bool] = None,
+    ):
+        self.max_bytes = max_bytes or settings.URL_FETCH_MAX_BYTES
+        self.timeout_s = timeout_s or settings.URL_FETCH_TIMEOUT_SECONDS
+        self.per_host_limit = per_host_limit or settings.URL_FETCH_PER_HOST_LIMIT
+        self.max_connections = max_connections or settings.URL_FETCH_MAX_CONNECTIONS
+        self.max_redirects = max_redirects if max_redirects is not None else settings.URL_FETCH_MAX_REDIRECTS
+        self.allow_private_hosts = (
+            allow_private_hosts if allow_private_hosts is not None else settings.URL_FETCH_ALLOW_PRIVATE_HOSTS
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, List] = {}  # host -> [semaphore, số request đang dùng]
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Tạo lazy trong event loop đang chạy (mỗi worker process có pool riêng)
+        if self._client is None:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            # httpx không nhận network_backend qua API public -> thay trên connection pool của transport
+            pool = transport._pool
+            pool._network_backend = PinnedNetworkBackend(pool._network_backend, self.allow_private_hosts)
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                trust_env=False,  # Không đi qua proxy từ env: proxy sẽ tự resolve / connect, bỏ qua kiểm tra IP
+                timeout=httpx.Timeout(self.timeout_s),
+                follow_redirects=False,  # Redirect xử lý thủ công để kiểm tra từng host
+                headers={"User-Agent": f"{settings.APP_NAME}/{settings.APP_VERSION}", "Accept": "image/*"},
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _host_slot(self, host: str):
+        """Giữ 1 slot của host; entry bị xóa khi host không còn request nào (dict không phình theo số host)"""
+        entry = self._host_limits.get(host)
+        if entry is None:
+            entry = self._host_limits[host] = [asyncio.Semaphore(self.per_host_limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._host_limits[host]
+
+    def _check_url(self, url: str) -> str:
+        """Chỉ kiểm tra scheme; địa chỉ IP được kiểm tra khi connect (PinnedNetworkBackend)"""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ImageFetchError("Only http(s) image URLs are supported")
+        return parts.hostname
+
+    async def fetch(self, url: str) -> bytes:
+        """Tải bytes ảnh (đã theo redirect), raise ImageFetchError nếu lỗi / vượt giới hạn"""
+        try:
+            return await asyncio.wait_for(self._fetch(url), timeout=self.timeout_s)
+        except asyncio.TimeoutError:
+            raise ImageFetchError("Timed out fetching image", status_code=504)
+
+    async def _fetch(self, url: str) -> bytes:
+        client = self._get_client()
+        for _ in range(self.max_redirects + 1):
+            host = self._check_url(url)
+            async with self._host_slot(host):
+                try:
+                    async with client.stream("GET", url) as response:
+                        if response.status_code in REDIRECT_STATUSES and "location" in response.headers:
+                            url = urljoin(url, response.headers["location"])
+                            continue
+                        if response.status_code != 200:
+                            raise ImageFetchError(
+                                f"Image URL returned HTTP {response.status_code}", status_code=502
+                            )
+                        content_type = response.headers.get("content-type", "")
+                        if content_type and not content_type.startswith(("image/", "application/octet-stream")):
+                            raise ImageFetchError(f"URL is not an image ({content_type.split(';')[0]})")
+                        declared = response.headers.get("content-length")
+                        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                            raise ImageFetchError("Image is too large", status_code=413)
+                        body = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            body += chunk
+                            if len(body) > self.max_bytes:
+                                raise ImageFetchError("Image is too large", status_code=413)
+                        return bytes(body)
+                except httpx.TimeoutException:
+                    raise ImageFetchError("Timed out fetching image", status_code=504)
+                except httpx.HTTPError as e:
+                    raise ImageFetchError(f"Failed to fetch image: {e.__class__.__name__}", status_code=502)
+        raise ImageFetchError("Too many redirects", status_code=502)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+image_fetcher = ImageFetcher()
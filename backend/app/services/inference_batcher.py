@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from app.config import get_settings
+from app.services.inference_executor import InferenceExecutor, InferenceOverloadedError
+
+if TYPE_CHECKING:
+    from app.services.ml_inference_service import MLInferenceService
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class InferenceBatcher:
+    """
+    Gom các request predict đồng thời thành batch để chạy 1 lần forward
+    - Batch được chốt khi đủ max_batch_size hoặc hết max_wait_ms kể từ request đầu tiên
+    - Kết quả (raw probabilities) được trả về từng request đang chờ
+    - Tối đa executor.workers batch chạy song song; vượt max_queue_depth thì từ chối ngay
+    """
+
+    def __init__(
+        self,
+        ml_service: "MLInferenceService",
+        executor: InferenceExecutor,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_queue_depth: Optional[int] = None,
+    ):
+        self.ml_service = ml_service
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size or settings.INFERENCE_BATCH_MAX_SIZE)
+        self.max_wait = max(0.0, (max_wait_ms if max_wait_ms is not None else settings.INFERENCE_BATCH_MAX_WAIT_MS) / 1000)
+        self.max_queue_depth = max_queue_depth or settings.INFERENCE_MAX_QUEUE_DEPTH
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0  # Số ảnh trong các batch đang chạy
+        self._tasks = set()
+
+    @property
+    def queue_depth(self) -> int:
+        """Số ảnh đang chờ hoặc đang được inference"""
+        return (self._queue.qsize() if self._queue else 0) + self._in_flight
+
+    def _ensure_worker(self):
+        """Khởi động worker gom batch trên event loop hiện tại (lazy)"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.executor.workers)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, image_bytes: bytes) -> List[float]:
+        """Đưa ảnh vào hàng đợi và chờ probabilities của batch chứa nó"""
+        self._ensure_worker()
+        if self.queue_depth >= self.max_queue_depth:
+            raise InferenceOverloadedError("Inference queue is full")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_bytes, future))
+        return await future
+
+    async def stop(self):
+        """Dừng worker, huỷ các request còn trong hàng đợi"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        while self._queue and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+        self._worker = None
+
+    async def _collect_batch(self) -> List[Tuple[bytes, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Lấy ngay những request đã có sẵn trong queue
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Chỉ gom batch mới khi có worker rảnh, để request dồn lại thành batch lớn hơn
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            # Bỏ các request client đã huỷ (disconnect) trước khi forward
+            batch = [(image_bytes, future) for image_bytes, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            self._in_flight += len(batch)
+            task = loop.create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch: List[Tuple[bytes, asyncio.Future]]):
+        try:
+            results = await self.executor.run(
+                self.ml_service.predict_probabilities_batch, [image_bytes for image_bytes, _ in batch]
+            )
+        except Exception as e:
+            logger.error(f"Batch inference failed ({len(batch)} images): {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight -= len(batch)
+            self._slots.release()
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,82 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.config import get_settings
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+
+class InferenceOverloadedError(RuntimeError):
+    """Hàng đợi inference đã đầy, request nên được từ chối (503) thay vì chờ"""
+
+
+def available_cpus() -> int:
+    """Số core process được phép chạy (tôn trọng CPU affinity của cluster worker / cgroup cpuset)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _resolve_threads_per_worker(workers: int, threads_per_worker: int, cpus: Optional[int] = None) -> int:
+    if threads_per_worker > 0:
+        return threads_per_worker
+    return max(1, (cpus or available_cpus()) // workers)
+
+
+def inference_threads_per_worker(cpus: Optional[int] = None) -> int:
+    """
+    Số intra-op threads mỗi inference thread dùng với cấu hình hiện tại (INFERENCE_WORKERS / THREADS_PER_WORKER)
+    cpus: số core của process sẽ chạy inference (master trước fork truyền số core của 1 cluster worker)
+    """
+    return _resolve_threads_per_worker(
+        max(1, settings.INFERENCE_WORKERS), settings.INFERENCE_THREADS_PER_WORKER, cpus
+    )
+
+
+class InferenceExecutor:
+    """
+    Thread pool riêng cho model inference (tách khỏi event loop và default executor)
+    - Mỗi worker thread chạy torch với số intra-op threads cố định
+    - pending: số tác vụ đang chạy hoặc chờ worker, dùng cho backpressure
+    """
+
+    def __init__(self, workers: Optional[int] = None, threads_per_worker: Optional[int] = None):
+        self.workers = max(1, workers or settings.INFERENCE_WORKERS)
+        self.threads_per_worker = _resolve_threads_per_worker(
+            self.workers,
+            threads_per_worker if threads_per_worker is not None else settings.INFERENCE_THREADS_PER_WORKER,
+        )
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+
+    def _init_worker(self):
+        import torch  # Import lazy: module này được import trước khi model load xong
+
+        torch.set_num_threads(self.threads_per_worker)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="inference",
+                initializer=self._init_worker,
+            )
+        return self._pool
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """Chạy fn(*args) trên inference worker và await kết quả"""
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
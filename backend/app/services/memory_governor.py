@@ -0,0 +1,125 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+from app.services.inference_executor import InferenceOverloadedError
+from app.services.metrics import DECODE_MEMORY_REJECTED
+from app.services.upload_reader import ImageBuffer, open_image
+
+settings = get_settings()
+
+
+def estimate_decoded_bytes(image_bytes: Union[ImageBuffer, np.ndarray], target_size: int) -> int:
+    """
+    Ước lượng bộ nhớ pixel khi decode ảnh (chỉ đọc header)
+    - JPEG: kích thước sau draft mode (DCT scaling như decode_image_for_model)
+    - Ảnh không phải RGB: thêm bản decode gốc trước khi convert sang RGB
+    Mảng RGB đã resize sẵn / ảnh không đọc được header -> 0 (không decode hoặc bị từ chối ngay)
+    """
+    if isinstance(image_bytes, np.ndarray):
+        return 0
+    try:
+        image = open_image(image_bytes)
+        width, height = image.size
+        mode, image_format = image.mode, image.format
+    except Exception:
+        return 0
+
+    if image_format == "JPEG":
+        # Cùng cách chọn scale của Image.draft: lớn nhất trong 8/4/2/1 mà vẫn >= target_size
+        scale = min(width // target_size, height // target_size)
+        for factor in (8, 4, 2, 1):
+            if scale >= factor:
+                break
+        width, height = -(-width // factor), -(-height // factor)
+
+    pixels = width * height
+    decoded = pixels * 3
+    if mode != "RGB":
+        decoded += pixels * Image.getmodebands(mode)
+    return decoded
+
+
+class DecodeMemoryGovernor:
+    """
+    Giới hạn tổng bộ nhớ pixel đã decode của mọi ảnh đang được xử lý trong process
+    - Mỗi ảnh giữ 1 phần budget (ước lượng từ header) từ lúc decode dHash đến khi có kết quả forward
+    - Hết budget -> chờ theo thứ tự đến (FIFO, ảnh lớn không bị bỏ đói), quá max_wait_s -> 503
+    - Ảnh lớn hơn cả budget vẫn được xử lý nhưng phải chạy một mình
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, max_wait_s: Optional[float] = None):
+        self.budget_bytes = budget_bytes or settings.DECODE_MEMORY_BUDGET_MB * 1024 * 1024
+        self.max_wait_s = max_wait_s if max_wait_s is not None else settings.DECODE_MEMORY_MAX_WAIT_SECONDS
+        self.in_use = 0
+        self.peak = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, future in self._waiters if not future.done())
+
+    def _take(self, nbytes: int):
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+
+    def _wake(self):
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + nbytes > self.budget_bytes:
+                break
+            self._waiters.popleft()
+            self._take(nbytes)
+            future.set_result(None)
+
+    async def acquire(self, nbytes: int) -> int:
+        """Giữ nbytes của budget, trả về số byte thực sự giữ (truyền lại cho release)"""
+        nbytes = min(nbytes, self.budget_bytes)
+        if not self._waiters and self.in_use + nbytes <= self.budget_bytes:
+            self._take(nbytes)
+            return nbytes
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((nbytes, future))
+        try:
+            await asyncio.wait_for(future, self.max_wait_s)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                self.release(nbytes)  # Đã được cấp đúng lúc bị hủy / hết giờ
+            else:
+                future.cancel()
+                self._wake()  # Request đứng đầu hàng rời đi có thể mở đường cho request sau
+            if isinstance(e, asyncio.TimeoutError):
+                DECODE_MEMORY_REJECTED.inc()
+                raise InferenceOverloadedError("Image decode memory budget exhausted")
+            raise
+        return nbytes
+
+    def release(self, nbytes: int):
+        self.in_use -= nbytes
+        self._wake()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        held = await self.acquire(nbytes) if nbytes > 0 else 0
+        try:
+            yield
+        finally:
+            if held:
+                self.release(held)
+
+    def stats(self) -> Dict:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "in_use_bytes": self.in_use,
+            "peak_bytes": self.peak,
+            "waiting": self.waiting,
+        }
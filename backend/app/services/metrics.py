@@ -0,0 +1,195 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bucket mặc định (giây) cho latency từng stage: 0.1 ms -> 10 s
+DEFAULT_LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    """Histogram cộng dồn in-process (tương thích Prometheus), thread-safe, hỗ trợ label"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        for key, bucket_counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    """Counter cộng dồn in-process, thread-safe, hỗ trợ label"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        for key, value in snapshot:
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge đọc giá trị tại thời điểm scrape qua callback"""
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], float]):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.callback())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class MetricsRegistry:
+    """Registry metrics của process, render ra text format của Prometheus cho /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, buckets)
+        return self._metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help_text)
+        return self._metrics[name]
+
+    def gauge(self, name: str, help_text: str, callback: Callable[[], float]) -> Gauge:
+        self._metrics[name] = Gauge(name, help_text, callback)
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+PREDICT_STAGE_SECONDS = metrics.histogram(
+    "xdynamic_predict_stage_seconds",
+    "Latency of each stage on the predict hot path",
+)
+PREDICTIONS_COALESCED = metrics.counter(
+    "xdynamic_predictions_coalesced_total",
+    "Predictions served by waiting on an identical in-flight computation",
+)
+PHASH_REUSES = metrics.counter(
+    "xdynamic_phash_reuses_total",
+    "Predictions answered with a near-duplicate image's result (not exact cache hits), by dHash distance",
+)
+DECODE_MEMORY_REJECTED = metrics.counter(
+    "xdynamic_decode_memory_rejected_total",
+    "Predictions rejected with 503 after waiting too long for decode memory budget",
+)
+TRIAGE_DECISIONS = metrics.counter(
+    "xdynamic_triage_decisions_total",
+    "Pre-inference triage verdicts (pass, or the reason the forward pass was skipped)",
+)
+TRIAGE_AUDITS = metrics.counter(
+    "xdynamic_triage_audits_total",
+    "Sampled triage skips re-checked with full inference (disagree = model flagged the image)",
+)
+CASCADE_IMAGES = metrics.counter(
+    "xdynamic_cascade_images_total",
+    "Images answered by the low-resolution first pass (accepted) or re-run on the full model (escalated)",
+)
+USAGE_LOG_FLUSH_SECONDS = metrics.histogram(
+    "xdynamic_usage_log_flush_seconds",
+    "Latency of one write-behind usage-log bulk insert",
+)
+USAGE_LOG_DROPPED = metrics.counter(
+    "xdynamic_usage_log_dropped_total",
+    "Usage-log records dropped because the write-behind buffer was full",
+)
+SUBSCRIPTION_CACHE_LOOKUPS = metrics.counter(
+    "xdynamic_subscription_cache_lookups_total",
+    "Active-subscription cache lookups (hit, or miss / stale / expired and read from the database)",
+)
+SUBSCRIPTION_CACHE_HIT_AGE_SECONDS = metrics.histogram(
+    "xdynamic_subscription_cache_hit_age_seconds",
+    "Age of the cached subscription served on a hit (how stale the answer could be)",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600),
+)
+AUTH_SECONDS = metrics.histogram(
+    "xdynamic_auth_seconds",
+    "Bearer-token authentication latency on every authenticated endpoint (principal cache or JWT verify + user load)",
+)
+AUTH_PRINCIPAL_LOOKUPS = metrics.counter(
+    "xdynamic_auth_principal_lookups_total",
+    "Bearer-token principal lookups served from the in-process cache (hit) or verified and loaded (miss)",
+)
+INFERENCE_BATCH_SIZE = metrics.histogram(
+    "xdynamic_inference_batch_size",
+    "Number of images per forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
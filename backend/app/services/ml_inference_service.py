@@ -1,18 +1,57 @@
+import numpy as np
 import torch
 import torch.nn as nn
-import torchvision.transforms as transforms
 from torchvision import models
 from PIL import Image
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence, Union
 from pathlib import Path
-import io
+import time
+import hashlib
+import logging
 
 from app.config import get_settings
+from app.services.preprocessing import BatchPreprocessor
+from app.services.model_variants import load_forward
+from app.services.warm_start import WarmStartCache
+from app.services.inference_executor import inference_threads_per_worker
+from app.services.cascade import InferenceCascade
+from app.services.upload_reader import ImageBuffer, open_image
+from app.services.metrics import PREDICT_STAGE_SECONDS, INFERENCE_BATCH_SIZE
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 BACKEND_ROOT = Path(__file__).resolve().parents[2]
 
 
+def decode_image_for_model(image_bytes: ImageBuffer, target_size: int, max_pixels: int) -> Image.Image:
+    """
+    Decode ảnh về RGB với chi phí thấp nhất có thể trước khi resize về target_size
+    - Đọc header trước, từ chối ảnh quá max_pixels trước khi decode pixel
+    - JPEG: dùng draft mode (DCT scaling 1/2, 1/4, 1/8) để decode thẳng ở kích thước >= target_size
+    - Bỏ qua convert khi ảnh đã là RGB
+    - Nhận memoryview của buffer upload, decoder đọc thẳng không copy
+    """
+    try:
+        image = open_image(image_bytes)
+    except Exception:
+        raise ValueError("Invalid image format")
+    
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ValueError(f"Image too large ({width}x{height}), max {max_pixels} pixels")
+    
+    try:
+        if image.format == "JPEG":
+            image.draft("RGB", (target_size, target_size))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        else:
+            image.load()
+    except Exception:
+        raise ValueError("Invalid image format")
+    return image
+
+
 class MultilabelMobileNetV2(nn.Module):
     """MobileNetV2 for multilabel classification - PHẢI GIỐNG TRONG NOTEBOOK TRAINING"""
     
@@ -36,60 +75,232 @@ class MultilabelMobileNetV2(nn.Module):
         return self.backbone(x)
 
 
+def resolve_model_path() -> Path:
+    model_path = Path(settings.MODEL_PATH)
+    if not model_path.is_absolute():
+        model_path = BACKEND_ROOT / model_path
+    return model_path
+
+
+def resolve_export_dir() -> Path:
+    export_dir = Path(settings.MODEL_EXPORT_DIR)
+    if not export_dir.is_absolute():
+        export_dir = BACKEND_ROOT / export_dir
+    return export_dir
+
+
+def resolve_warm_start_dir() -> Path:
+    warm_start_dir = Path(settings.MODEL_WARM_START_DIR)
+    if not warm_start_dir.is_absolute():
+        warm_start_dir = BACKEND_ROOT / warm_start_dir
+    return warm_start_dir
+
+
+def load_fp32_model(model_path: Path, num_classes: int, device: torch.device) -> MultilabelMobileNetV2:
+    """Tạo model với cùng kiến trúc như lúc training và load state dict fp32"""
+    try:
+        # mmap: không copy file weights vào RAM; dựng model trên meta device để bỏ qua random init
+        state_dict = torch.load(model_path, map_location=device, mmap=True, weights_only=True)
+        with torch.device("meta"):
+            model = MultilabelMobileNetV2(num_classes=num_classes, pretrained=False)
+        model.load_state_dict(state_dict, assign=True)
+    except RuntimeError:
+        # File weights định dạng cũ (không phải zipfile) không mmap được
+        model = MultilabelMobileNetV2(num_classes=num_classes, pretrained=False)
+        model.load_state_dict(torch.load(model_path, map_location=device))
+    model.to(device)
+    model.eval()
+    return model
+
+
 class MLInferenceService:
     """Service load model AI và thực hiện inference (detect dangerous objects)"""
     
-    def __init__(self):
+    def __init__(self, warm_start_threads: Optional[int] = None):
+        """warm_start_threads: số threads của inference worker sẽ chạy model (mặc định: process hiện tại)"""
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
-        self.transform = None
+        self.forward = None
+        self.backend = settings.MODEL_BACKEND
+        self.preprocessor = None
+        self.model_version = None
         self.class_names = settings.MODEL_CLASSES
+        self.load_time_s = None
+        self.warm_start = "disabled"
+        self.warm_start_threads = warm_start_threads or inference_threads_per_worker()
+        self.cascade = None
+        start_time = time.perf_counter()
         self._load_model()
+        self.load_time_s = time.perf_counter() - start_time
     
     def _load_model(self):
-        """Load weights từ file .pth và chuẩn bị transform (resize 224x224, normalize ImageNet)"""
+        """Load weights từ file .pth và chuẩn bị preprocessor (resize 224x224, normalize ImageNet)"""
         try:
-            # Tạo model với cùng kiến trúc như lúc training
-            self.model = MultilabelMobileNetV2(num_classes=len(self.class_names), pretrained=False)
+            model_path = resolve_model_path()
+            self.model_version = self._hash_weights(model_path)
+            if self.backend != "eager":
+                # Probabilities của variant lệch nhẹ so với fp32 -> tách cache theo backend
+                self.model_version = f"{self.model_version}-{self.backend}"
+            if settings.CASCADE_ENABLED:
+                # Trước khi chọn forward: model_version (key cache / warm-start) phải là giá trị cuối cùng
+                self._enable_cascade()
+            if self.backend == "eager" and self.device.type == "cpu" and settings.MODEL_WARM_START_ENABLED:
+                self.forward = self._load_warm_start(model_path)
+            else:
+                self._load_fp32(model_path)
+                # Chọn backend chạy forward (eager / int8 / torchscript / onnx)
+                self.forward = load_forward(self.backend, self.model, model_path, resolve_export_dir(), self.device)
             
-            # Load state dict
-            model_path = Path(settings.MODEL_PATH)
-            if not model_path.is_absolute():
-                model_path = BACKEND_ROOT / model_path
-            state_dict = torch.load(model_path, map_location=self.device)
-            self.model.load_state_dict(state_dict)
-            
-            self.model.to(self.device)
-            self.model.eval()
-            
-            # Transform giống như trong notebook (validation transform)
-            self.transform = transforms.Compose([
-                transforms.Resize((settings.MODEL_IMG_SIZE, settings.MODEL_IMG_SIZE)),
-                transforms.ToTensor(),
-                transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
-            ])
+            # Tương đương validation transform trong notebook (Resize -> ToTensor -> Normalize ImageNet)
+            self.preprocessor = BatchPreprocessor(
+                settings.MODEL_IMG_SIZE, initial_batch_size=settings.INFERENCE_BATCH_MAX_SIZE
+            )
         except Exception as e:
             raise RuntimeError(f"Failed to load ML model: {e}")
     
-    def predict(self, image_bytes: bytes, threshold: float = 0.5) -> Dict:
-        """Dự đoán dangerous objects trong ảnh (trả về classes, probabilities, active classes)"""
-        if not self.model or not self.transform:
+    def _enable_cascade(self):
+        if self.backend == "onnx":
+            # Graph ONNX export cố định H x W, không chạy được ở độ phân giải first pass
+            logger.warning("CASCADE_ENABLED is ignored for MODEL_BACKEND=onnx")
+            return
+        self.cascade = InferenceCascade()
+        # Kết quả ảnh được first pass chấp nhận khác full model -> tách cache
+        self.model_version = f"{self.model_version}-cascade{self.cascade.first_pass_size}"
+    
+    def _load_fp32(self, model_path: Path):
+        self.model = load_fp32_model(model_path, len(self.class_names), self.device)
+        if self.device.type == "cpu":
+            # Conv oneDNN trên CPU nhanh hơn với channels-last (khớp output của preprocessor)
+            self.model.to(memory_format=torch.channels_last)
+    
+    def _warm_start_key(self, warm_start: WarmStartCache, threads: int) -> str:
+        return warm_start.make_key(self.model_version, settings.MODEL_IMG_SIZE, threads)
+    
+    def _load_warm_start(self, model_path: Path):
+        """
+        Forward từ warm-start artifact (TorchScript frozen đã tuning) nếu có, theo số threads của inference worker
+        (ở cluster master: key của worker -> artifact load 1 lần trước fork, các worker dùng chung copy-on-write)
+        Miss -> tạm chạy model eager; build_warm_start() build artifact sau (trong worker, không ở master)
+        """
+        warm_start = WarmStartCache(resolve_warm_start_dir())
+        forward = warm_start.load(self._warm_start_key(warm_start, self.warm_start_threads))
+        if forward is not None:
+            self.warm_start = "hit"
+            return forward
+        self.warm_start = "miss"
+        self._load_fp32(model_path)
+        return self.model
+    
+    def build_warm_start(self):
+        """
+        Sau một lần miss: load lại theo key của process hiện tại (worker khác có thể vừa build xong),
+        chưa có thì tuning + lưu artifact ở số threads của inference worker -> lần start sau master load được
+        """
+        if self.warm_start != "miss":
+            return
+        threads = inference_threads_per_worker()
+        warm_start = WarmStartCache(resolve_warm_start_dir())
+        key = self._warm_start_key(warm_start, threads)
+        forward = warm_start.load(key)
+        if forward is not None:
+            self.warm_start = "hit"
+        else:
+            forward = warm_start.build(key, self.model, settings.MODEL_IMG_SIZE, threads)
+            self.warm_start = "built"
+        self.forward = forward
+    
+    @staticmethod
+    def _hash_weights(model_path: Path) -> str:
+        """Hash file weights để làm model version (dùng cho cache key)"""
+        digest = hashlib.sha256()
+        with open(model_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()[:12]
+    
+    def decode_image(self, image_bytes: Union[ImageBuffer, np.ndarray]) -> Union[Image.Image, np.ndarray]:
+        """
+        Decode bytes ảnh upload thành PIL Image RGB (kích thước gần MODEL_IMG_SIZE nếu là JPEG)
+        Mảng RGB đã resize sẵn (/predict/rgb) được trả nguyên, không cần decode.
+        """
+        if isinstance(image_bytes, np.ndarray):
+            return image_bytes
+        return decode_image_for_model(image_bytes, settings.MODEL_IMG_SIZE, settings.MODEL_MAX_IMAGE_PIXELS)
+    
+    def predict_probabilities_batch(self, images_bytes: List[bytes]) -> List[Union[List[float], ValueError]]:
+        """
+        Chạy 1 lần forward cho cả batch ảnh, trả về probabilities theo đúng thứ tự input
+        - Ảnh decode lỗi: phần tử tương ứng là ValueError (không làm hỏng cả batch)
+        """
+        if not self.forward or not self.preprocessor:
             raise RuntimeError("Model not loaded")
         
-        # Load and preprocess image
-        try:
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        except Exception:
-            raise ValueError("Invalid image format")
+        results: List[Union[List[float], ValueError]] = [None] * len(images_bytes)
+        images = []
+        positions = []
+        for index, image_bytes in enumerate(images_bytes):
+            try:
+                with PREDICT_STAGE_SECONDS.time(stage="image_decode"):
+                    image = self.decode_image(image_bytes)
+            except ValueError as e:
+                results[index] = e
+                continue
+            images.append(image)
+            positions.append(index)
         
-        input_tensor = self.transform(image).unsqueeze(0).to(self.device)
+        if images:
+            INFERENCE_BATCH_SIZE.observe(len(images))
+            if self.cascade is not None:
+                probabilities = self._cascade_probabilities(images)
+            else:
+                probabilities = self._probabilities(images, self.preprocessor, "forward")
+            for index, probs in zip(positions, probabilities):
+                results[index] = probs
         
-        # Inference
-        with torch.no_grad():
-            logits = self.model(input_tensor)
-            probabilities = torch.sigmoid(logits).cpu().numpy()[0].tolist()
+        return results
+    
+    def _probabilities(self, images: List, preprocessor: BatchPreprocessor, stage: str) -> List[List[float]]:
+        with PREDICT_STAGE_SECONDS.time(stage="preprocess"):
+            input_tensor = preprocessor(images).to(self.device)
+        with PREDICT_STAGE_SECONDS.time(stage=stage), torch.inference_mode():
+            logits = self.forward(input_tensor)
+            return torch.sigmoid(logits).cpu().numpy().tolist()
+    
+    def _cascade_probabilities(self, images: List) -> List[List[float]]:
+        """First pass độ phân giải thấp cho cả batch, chỉ ảnh không chắc chắn (và ảnh audit) chạy full model"""
+        cascade = self.cascade
+        start = time.perf_counter()
+        probabilities = self._probabilities(images, cascade.preprocessor, "cascade_first_pass")
+        first_pass_s = time.perf_counter() - start
         
-        # Filter active classes
+        escalated = [i for i, probs in enumerate(probabilities) if cascade.needs_full_model(probs)]
+        accepted = set(range(len(images))) - set(escalated)
+        audited = [i for i in sorted(accepted) if cascade.should_audit()]
+        full_s = 0.0
+        if escalated or audited:
+            rerun = escalated + audited
+            start = time.perf_counter()
+            full = self._probabilities([images[i] for i in rerun], self.preprocessor, "forward")
+            full_s = time.perf_counter() - start
+            for i, probs in zip(rerun, full):
+                if i in audited:
+                    cascade.record_audit(probabilities[i], probs)
+                probabilities[i] = probs
+        cascade.record_batch(len(images), len(escalated), first_pass_s, len(escalated) + len(audited), full_s)
+        return probabilities
+    
+    def warmup(self, batch_sizes: Sequence[int] = (1,), runs: int = 1):
+        """Chạy forward với ảnh giả để lần predict đầu tiên không phải chịu chi phí khởi tạo kernel"""
+        image = Image.new("RGB", (settings.MODEL_IMG_SIZE, settings.MODEL_IMG_SIZE), (127, 127, 127))
+        with torch.inference_mode():
+            for batch_size in batch_sizes:
+                for _ in range(runs):
+                    self.forward(self.preprocessor([image] * batch_size).to(self.device))
+                    if self.cascade is not None:
+                        self.forward(self.cascade.preprocessor([image] * batch_size).to(self.device))
+    
+    def build_result(self, probabilities: List[float], threshold: float = 0.5) -> Dict:
+        """Áp dụng threshold lên probabilities để lấy danh sách active classes"""
         active_classes = [
             cls for cls, prob in zip(self.class_names, probabilities)
             if prob >= threshold
@@ -100,3 +311,10 @@ class MLInferenceService:
             "probabilities": probabilities,
             "active": active_classes
         }
+    
+    def predict(self, image_bytes: bytes, threshold: float = 0.5) -> Dict:
+        """Dự đoán dangerous objects trong ảnh (trả về classes, probabilities, active classes)"""
+        result = self.predict_probabilities_batch([image_bytes])[0]
+        if isinstance(result, ValueError):
+            raise result
+        return self.build_result(result, threshold)
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from app.config import get_settings
+from app.services.metrics import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Mốc thời gian process import app (xấp xỉ thời điểm khởi động) để tính cold start
+PROCESS_STARTED_AT = time.perf_counter()
+
+
+class ModelState:
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class ModelManager:
+    """
+    Quản lý vòng đời model và inference stack (executor, batcher, cache, pipeline)
+    - torch / torchvision chỉ được import khi load, nên import app.main không phải chờ model
+    - start(): load + warmup trong background thread khi app khởi động (lifespan)
+    - Trước khi ready, predict trả 503 + Retry-After; /ready phản ánh trạng thái này
+    """
+
+    def __init__(self):
+        self.state = ModelState.PENDING
+        self.error: Optional[str] = None
+        self.ml_service = None
+        self.executor = None
+        self.batcher = None
+        self.cache = None
+        self.phash_index = None
+        self.pipeline = None
+        self.memory_governor = None
+        self.time_to_healthy_s: Optional[float] = None
+        self.time_to_ready_s: Optional[float] = None
+        self.warmup_s: Optional[float] = None
+        self._preloaded = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == ModelState.READY
+
+    def preload(self, worker_cpus: Optional[int] = None):
+        """
+        Chỉ load weights (hoặc warm-start artifact có sẵn), không build warm-start / warmup / thread pool /
+        kết nối cache (dùng ở master trước khi fork)
+        worker_cpus: số core của mỗi worker -> warm-start artifact được chọn theo số threads của worker
+        Các worker fork ra dùng chung trang nhớ của weights / artifact (copy-on-write) và tự dựng phần còn lại
+        """
+        if settings.MODEL_BACKEND == "onnx":
+            # Session onnxruntime giữ thread pool riêng, không an toàn khi fork: mỗi worker tự load
+            logger.warning("MODEL_BACKEND=onnx: skipping preload, each worker loads its own session")
+            return None
+        from app.services.inference_executor import inference_threads_per_worker
+        from app.services.ml_inference_service import MLInferenceService
+
+        self._preloaded = MLInferenceService(warm_start_threads=inference_threads_per_worker(worker_cpus))
+        return self._preloaded
+
+    def load(self):
+        """Load model và dựng inference stack (blocking, chạy trong thread hoặc script)"""
+        if self.state == ModelState.READY:
+            return
+        self.state = ModelState.LOADING
+        try:
+            from app.services.ml_inference_service import MLInferenceService
+            from app.services.inference_executor import InferenceExecutor
+            from app.services.inference_batcher import InferenceBatcher
+            from app.services.prediction_cache import build_prediction_cache
+            from app.services.perceptual_index import PerceptualHashIndex
+            from app.services.prediction_pipeline import PredictionPipeline
+            from app.services.memory_governor import DecodeMemoryGovernor
+            from app.services.triage import ImageTriage
+            from app.services.warm_start import PROFILING_RUNS
+
+            ml_service = self._preloaded or MLInferenceService()
+            # Warm-start miss: master chỉ load weights, tuning chạy ở đây (worker, đúng số threads / CPU)
+            ml_service.build_warm_start()
+            warmup_start = time.perf_counter()
+            # Batch nhỏ nhất và lớn nhất của batcher, đủ số lượt để TorchScript profiling xong
+            ml_service.warmup(batch_sizes=(1, settings.INFERENCE_BATCH_MAX_SIZE), runs=PROFILING_RUNS)
+            self.warmup_s = time.perf_counter() - warmup_start
+
+            self.executor = InferenceExecutor()
+            self.batcher = InferenceBatcher(ml_service, self.executor)
+            self.cache = build_prediction_cache(ml_service.model_version)
+            self.phash_index = PerceptualHashIndex() if settings.PHASH_ENABLED else None
+            self.memory_governor = DecodeMemoryGovernor() if settings.DECODE_MEMORY_BUDGET_MB > 0 else None
+            triage = ImageTriage() if settings.TRIAGE_ENABLED else None
+            self.pipeline = PredictionPipeline(
+                self.batcher, self.cache, self.phash_index, self.memory_governor, triage
+            )
+            self.ml_service = ml_service
+        except Exception as e:
+            self.state = ModelState.FAILED
+            self.error = str(e)
+            logger.error(f"Model loading failed: {e}")
+            raise
+
+        self.time_to_ready_s = time.perf_counter() - PROCESS_STARTED_AT
+        self.state = ModelState.READY
+        logger.info(
+            f"Model ready: load {ml_service.load_time_s:.2f}s, warmup {self.warmup_s:.2f}s, "
+            f"cold start {self.time_to_ready_s:.2f}s since process start"
+        )
+
+    def start(self):
+        """Bắt đầu load model ở background; gọi từ lifespan sau khi app đã sẵn sàng phục vụ"""
+        self.time_to_healthy_s = time.perf_counter() - PROCESS_STARTED_AT
+        logger.info(f"App healthy {self.time_to_healthy_s:.2f}s after process start, loading model in background")
+        if self._task is None and self.state != ModelState.READY:
+            self._task = asyncio.get_running_loop().create_task(self._load_in_background())
+
+    async def _load_in_background(self):
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception:
+            pass  # Lỗi đã được ghi nhận trong self.error và hiển thị ở /ready
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        if self.batcher is not None:
+            await self.batcher.stop()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def status(self) -> Dict:
+        return {
+            "status": self.state,
+            "model_version": self.ml_service.model_version if self.ml_service else None,
+            "model_backend": settings.MODEL_BACKEND,
+            "model_load_s": self.ml_service.load_time_s if self.ml_service else None,
+            "warm_start": self.ml_service.warm_start if self.ml_service else None,
+            "cascade": self.ml_service.cascade.stats() if self.ml_service and self.ml_service.cascade else None,
+            "warmup_s": self.warmup_s,
+            "time_to_healthy_s": self.time_to_healthy_s,
+            "time_to_ready_s": self.time_to_ready_s,
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+model_manager = ModelManager()
+
+
+def _cascade_stat(name: str) -> float:
+    cascade = getattr(model_manager.ml_service, "cascade", None)
+    return getattr(cascade, name) if cascade else 0
+
+# Runtime gauges exposed on /metrics
+metrics.gauge("xdynamic_model_ready", "1 when the model is loaded and warm",
+              lambda: 1 if model_manager.is_ready else 0)
+metrics.gauge("xdynamic_inference_queue_depth", "Images queued or running in the inference engine",
+              lambda: model_manager.batcher.queue_depth if model_manager.batcher else 0)
+metrics.gauge("xdynamic_predictions_in_flight", "Distinct images currently being predicted (single-flight keys)",
+              lambda: model_manager.pipeline.in_flight if model_manager.pipeline else 0)
+metrics.gauge("xdynamic_decode_memory_bytes", "Decoded-pixel memory currently reserved by in-flight images",
+              lambda: model_manager.memory_governor.in_use if model_manager.memory_governor else 0)
+metrics.gauge("xdynamic_decode_memory_peak_bytes", "Peak decoded-pixel memory reserved since startup",
+              lambda: model_manager.memory_governor.peak if model_manager.memory_governor else 0)
+metrics.gauge("xdynamic_decode_memory_waiting", "Images waiting for decode memory budget",
+              lambda: model_manager.memory_governor.waiting if model_manager.memory_governor else 0)
+metrics.gauge("xdynamic_cascade_escalation_ratio", "Share of images escalated from the cascade first pass to the full model",
+              lambda: _cascade_stat("escalation_ratio"))
+metrics.gauge("xdynamic_cascade_seconds_saved", "Estimated forward time saved by the cascade (net of first-pass cost)",
+              lambda: _cascade_stat("seconds_saved"))
+metrics.gauge("xdynamic_cascade_agreement_ratio", "Audited first-pass results that match the full model at threshold 0.5",
+              lambda: _cascade_stat("agreement_ratio"))
+metrics.gauge("xdynamic_prediction_cache_hit_ratio", "Exact-content prediction cache hit ratio",
+              lambda: model_manager.cache.stats()["hit_ratio"] if model_manager.cache else 0)
+metrics.gauge("xdynamic_phash_short_circuit_ratio", "Share of perceptual-hash lookups that skipped inference",
+              lambda: model_manager.phash_index.stats()["short_circuit_ratio"] if model_manager.phash_index else 0)
+metrics.gauge("xdynamic_model_load_seconds", "Time spent loading the model at startup",
+              lambda: model_manager.ml_service.load_time_s if model_manager.ml_service else 0)
+metrics.gauge("xdynamic_time_to_ready_seconds", "Seconds from process start until the model was warm",
+              lambda: model_manager.time_to_ready_s or 0)
@@ -0,0 +1,175 @@
+import copy
+import zipfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+MODEL_BACKENDS = ("eager", "int8", "torchscript", "onnx")
+ONNX_INPUT_NAME = "input"
+# Backend kernel int8 theo thứ tự ưu tiên: x86 / fbgemm (CPU x86), qnnpack (ARM)
+INT8_QENGINES = ("x86", "fbgemm", "qnnpack")
+# Ghi engine đã dùng khi export vào artifact int8 (_extra_files của TorchScript)
+QENGINE_EXTRA_FILE = "qengine"
+
+
+def select_qengine(preferred: Optional[str] = None) -> str:
+    """Engine int8 mà bản build torch trên máy này hỗ trợ (ưu tiên preferred nếu có)"""
+    supported = torch.backends.quantized.supported_engines
+    for engine in ((preferred,) if preferred else ()) + INT8_QENGINES:
+        if engine in supported:
+            return engine
+    raise RuntimeError(f"No int8 quantized engine available (supported: {', '.join(supported)})")
+
+
+def exported_qengine(path: Path) -> Optional[str]:
+    """Engine int8 ghi trong artifact lúc export (None với artifact cũ không có thông tin này)"""
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if name.endswith(f"/extra/{QENGINE_EXTRA_FILE}"):
+                return archive.read(name).decode() or None
+    return None
+
+
+def variant_path(export_dir: Path, model_path: Path, backend: str) -> Path:
+    """Đường dẫn artifact của từng variant, đặt theo tên file weights gốc"""
+    suffix = {"int8": ".int8.pt", "torchscript": ".torchscript.pt", "onnx": ".onnx"}[backend]
+    return export_dir / f"{model_path.stem}{suffix}"
+
+
+def quantize_static_int8(model: nn.Module, calibration_batches: List[torch.Tensor]) -> nn.Module:
+    """
+    Post-training static int8 quantization (FX graph mode) cho toàn bộ model
+    - Conv2d (gần như toàn bộ compute của MobileNetV2) + Linear: weights int8 per-channel, activation int8
+    - Conv + BatchNorm + ReLU6 được fuse; scale / zero-point của activation lấy từ calibration_batches
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if not calibration_batches:
+        raise ValueError("Static int8 quantization requires calibration batches")
+    engine = select_qengine()
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(
+        copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (calibration_batches[0],)
+    )
+    with torch.inference_mode():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def export_variants(model: nn.Module, model_path: Path, export_dir: Path, img_size: int,
+                    backends: Optional[List[str]] = None,
+                    calibration_batches: Optional[List[torch.Tensor]] = None) -> Dict[str, Path]:
+    """
+    Export model fp32 (eager, eval) ra các variant int8 / TorchScript frozen / ONNX
+    int8 cần calibration_batches (ảnh đã preprocess như production) để tính scale của activation.
+    """
+    export_dir.mkdir(parents=True, exist_ok=True)
+    backends = backends or ["int8", "torchscript", "onnx"]
+    model = model.eval()
+    example = torch.randn(1, 3, img_size, img_size)
+    exported = {}
+
+    if "int8" in backends:
+        path = variant_path(export_dir, model_path, "int8")
+        quantized = quantize_static_int8(model, calibration_batches or [])
+        with torch.inference_mode():
+            scripted = torch.jit.trace(quantized, example)
+        torch.jit.save(scripted, str(path), _extra_files={QENGINE_EXTRA_FILE: torch.backends.quantized.engine})
+        exported["int8"] = path
+
+    if "torchscript" in backends:
+        path = variant_path(export_dir, model_path, "torchscript")
+        with torch.no_grad():
+            frozen = torch.jit.freeze(torch.jit.trace(model, example))
+        # optimize_for_inference (prepack oneDNN) không serialize được: áp dụng lúc load
+        torch.jit.save(frozen, str(path))
+        exported["torchscript"] = path
+
+    if "onnx" in backends:
+        path = variant_path(export_dir, model_path, "onnx")
+        torch.onnx.export(
+            model, example, str(path),
+            input_names=[ONNX_INPUT_NAME], output_names=["logits"],
+            dynamic_axes={ONNX_INPUT_NAME: {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+        )
+        exported["onnx"] = path
+
+    return exported
+
+
+def load_forward(backend: str, model: nn.Module, model_path: Path, export_dir: Path,
+                 device: torch.device) -> Callable[[torch.Tensor], torch.Tensor]:
+    """
+    Trả về hàm forward (input NCHW float32 -> logits) cho backend đã chọn
+    - eager: model PyTorch gốc
+    - int8 / torchscript / onnx: bắt buộc có artifact (chạy export_model.py trước;
+      int8 cần calibration nên không quantize lúc load)
+    """
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown MODEL_BACKEND '{backend}', choose one of {', '.join(MODEL_BACKENDS)}")
+
+    if backend == "eager":
+        return model
+
+    path = variant_path(export_dir, model_path, backend)
+
+    if not path.exists():
+        raise FileNotFoundError(f"Model variant not found: {path} (run export_model.py first)")
+
+    if backend == "int8":
+        # Engine phải được đặt trước khi load (packed weights được pack lại theo engine hiện tại):
+        # dùng engine lúc export (khớp qconfig), máy không có engine đó thì dùng engine sẵn có
+        torch.backends.quantized.engine = select_qengine(exported_qengine(path))
+        return torch.jit.load(str(path), map_location="cpu")
+
+    if backend == "torchscript":
+        return torch.jit.optimize_for_inference(torch.jit.load(str(path), map_location=device))
+
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise RuntimeError("MODEL_BACKEND=onnx requires the onnxruntime package")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = torch.get_num_threads()
+    session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+
+    def onnx_forward(input_tensor: torch.Tensor) -> torch.Tensor:
+        inputs = np.ascontiguousarray(input_tensor.cpu().numpy())
+        return torch.from_numpy(session.run(None, {ONNX_INPUT_NAME: inputs})[0])
+
+    return onnx_forward
+
+
+def parity_check(reference: Callable[[torch.Tensor], torch.Tensor],
+                 candidate: Callable[[torch.Tensor], torch.Tensor],
+                 batches: List[torch.Tensor], threshold: float = 0.5) -> Dict:
+    """So sánh probabilities của variant với model fp32 trên cùng dữ liệu validation"""
+    max_abs_diff = 0.0
+    total_diff = 0.0
+    label_matches = 0
+    labels = 0
+    images = 0
+    with torch.inference_mode():
+        for batch in batches:
+            expected = torch.sigmoid(reference(batch)).float()
+            actual = torch.sigmoid(candidate(batch)).float()
+            diff = (expected - actual).abs()
+            max_abs_diff = max(max_abs_diff, diff.max().item())
+            total_diff += diff.sum().item()
+            label_matches += ((expected >= threshold) == (actual >= threshold)).sum().item()
+            labels += expected.numel()
+            images += expected.shape[0]
+    return {
+        "images": images,
+        "max_abs_diff": max_abs_diff,
+        "mean_abs_diff": total_diff / labels if labels else 0.0,
+        "label_agreement": label_matches / labels if labels else 1.0,
+    }
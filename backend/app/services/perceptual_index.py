@@ -0,0 +1,162 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+from app.services.metrics import PHASH_REUSES
+from app.services.upload_reader import ImageBuffer, open_image
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+DHASH_SIZE = 8  # 8x8 = hash 64 bit
+
+
+def load_grayscale(image_bytes: Union[ImageBuffer, np.ndarray]) -> Optional[Tuple[Image.Image, Tuple[int, int]]]:
+    """
+    Decode ảnh xám cỡ nhỏ dùng chung cho dHash và triage, kèm kích thước gốc (width, height)
+    - JPEG: decode thẳng ở kích thước nhỏ (DCT scaling) thay vì full resolution
+    - Nhận cả mảng RGB uint8 HWC (ảnh client đã resize sẵn); None nếu không decode được
+    """
+    try:
+        if isinstance(image_bytes, np.ndarray):
+            image = Image.fromarray(image_bytes)
+            size = image.size
+        else:
+            image = open_image(image_bytes)
+            size = image.size
+            image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+        return image.convert("L"), size
+    except Exception:
+        return None
+
+
+def dhash_from_grayscale(gray: Image.Image) -> int:
+    """Difference hash 64 bit: so sánh độ sáng các pixel kề nhau trên thumbnail 9x8"""
+    thumbnail = gray.resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR)
+    pixels = list(thumbnail.getdata())
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def compute_dhash(image_bytes: Union[ImageBuffer, np.ndarray]) -> Optional[int]:
+    """
+    Tính difference hash 64 bit của ảnh
+    - Ổn định khi ảnh bị re-encode JPEG / resize, trả về None nếu không decode được
+    """
+    loaded = load_grayscale(image_bytes)
+    return dhash_from_grayscale(loaded[0]) if loaded is not None else None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """BK-tree theo Hamming distance để tìm hash gần nhất trong bán kính cho trước"""
+
+    def __init__(self):
+        self._root: Optional[Tuple[int, Dict[int, tuple]]] = None
+        self.size = 0
+
+    def add(self, value: int):
+        if self._root is None:
+            self._root = (value, {})
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = child
+
+    def find_nearest(self, value: int, max_distance: int) -> Optional[Tuple[int, int]]:
+        """Trả về (hash, distance) gần nhất với distance <= max_distance, hoặc None"""
+        if self._root is None:
+            return None
+        best: Optional[Tuple[int, int]] = None
+        stack = [self._root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming_distance(value, node_value)
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = (node_value, distance)
+                if distance == 0:
+                    break
+            # Bất đẳng thức tam giác: chỉ duyệt nhánh có |d - k| <= bán kính
+            radius = best[1] if best else max_distance
+            for child_distance, child in children.items():
+                if abs(child_distance - distance) <= radius:
+                    stack.append(child)
+        return best
+
+
+class PerceptualHashIndex:
+    """
+    Index dHash -> probabilities để tái sử dụng kết quả cho ảnh trông giống hệt nhau
+    (cùng ảnh nhưng khác chất lượng JPEG / kích thước / canvas re-encode)
+    - Mỗi lần dùng lại được đếm riêng với cache hit chính xác, theo distance (xdynamic_phash_reuses_total)
+    - Giữ tối đa max_entries hash, khi đầy bỏ nửa cũ nhất và build lại BK-tree
+    """
+
+    def __init__(self, max_distance: Optional[int] = None, max_entries: Optional[int] = None):
+        self.max_distance = max_distance if max_distance is not None else settings.PHASH_MAX_DISTANCE
+        self.max_entries = max(2, max_entries or settings.PHASH_MAX_ENTRIES)
+        self._probabilities: "OrderedDict[int, List[float]]" = OrderedDict()
+        self._tree = BKTree()
+        self.lookups = 0
+        self.short_circuits = 0
+        self.rebuilds = 0
+
+    def lookup(self, image_hash: int) -> Optional[List[float]]:
+        self.lookups += 1
+        match = self._tree.find_nearest(image_hash, self.max_distance)
+        if match is None:
+            return None
+        self.short_circuits += 1
+        PHASH_REUSES.inc(distance=str(match[1]))
+        logger.debug(f"Reusing near-duplicate result: dHash {image_hash:016x} ~ {match[0]:016x} (distance {match[1]})")
+        return list(self._probabilities[match[0]])
+
+    def add(self, image_hash: int, probabilities: List[float]):
+        if image_hash in self._probabilities:
+            return
+        if len(self._probabilities) >= self.max_entries:
+            self._evict_oldest_half()
+        self._probabilities[image_hash] = list(probabilities)
+        self._tree.add(image_hash)
+
+    def _evict_oldest_half(self):
+        for _ in range(len(self._probabilities) // 2):
+            self._probabilities.popitem(last=False)
+        self._tree = BKTree()
+        for image_hash in self._probabilities:
+            self._tree.add(image_hash)
+        self.rebuilds += 1
+
+    def clear(self):
+        self._probabilities.clear()
+        self._tree = BKTree()
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._probabilities),
+            "max_distance": self.max_distance,
+            "lookups": self.lookups,
+            "short_circuits": self.short_circuits,
+            "short_circuit_ratio": self.short_circuits / self.lookups if self.lookups else 0.0,
+            "rebuilds": self.rebuilds,
+        }
@@ -0,0 +1,360 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+BACKEND_ROOT = Path(__file__).resolve().parents[2]
+
+# Ước lượng overhead của 1 entry trong dict/OrderedDict (key object, tuple, list)
+_ENTRY_OVERHEAD_BYTES = 200
+# SQLite tier: số lần hit gom lại trước khi ghi last_access (1 executemany thay cho UPDATE mỗi hit)
+TOUCH_BATCH_SIZE = 256
+# Số entry LRU xoá mỗi lệnh DELETE khi evict
+EVICT_BATCH_SIZE = 256
+# Số lệnh ghi xuống tầng blocking đang chờ tối đa; vượt -> bỏ qua lần ghi (chỉ là cache)
+MAX_PENDING_WRITES = 4096
+
+
+def _pack(probabilities: List[float]) -> bytes:
+    return struct.pack(f"<{len(probabilities)}f", *probabilities)
+
+
+def _unpack(blob: bytes) -> List[float]:
+    return list(struct.unpack(f"<{len(blob) // 4}f", blob))
+
+
+class CacheBackend:
+    """Interface cho 1 tầng cache probabilities (key -> raw probability vector)"""
+
+    name = "base"
+    blocking = False  # True: get / set chạm disk -> PredictionCache gọi trên thread riêng, không trên event loop
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[List[float]]:
+        raise NotImplementedError
+
+    def set(self, key: str, probabilities: List[float]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryCacheBackend(CacheBackend):
+    """Cache in-process, LRU + TTL, giới hạn theo tổng số bytes ước lượng"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[List[float], float, int]]" = OrderedDict()
+        self._size_bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            probabilities, expires_at, size = entry
+            if self.ttl_seconds and expires_at < time.monotonic():
+                del self._entries[key]
+                self._size_bytes -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(probabilities)
+
+    def set(self, key: str, probabilities: List[float]):
+        size = len(key) + 8 * len(probabilities) + _ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size_bytes -= old[2]
+            self._entries[key] = (list(probabilities), time.monotonic() + self.ttl_seconds, size)
+            self._size_bytes += size
+            while self._size_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "entries": len(self._entries),
+            "size_bytes": self._size_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Cache trên file SQLite local (sống qua restart), LRU theo last_access + TTL
+    - last_access của các lần hit được gom lại, ghi mỗi TOUCH_BATCH_SIZE hit hoặc trước khi evict
+    - Evict xoá theo từng nhóm EVICT_BATCH_SIZE entry cũ nhất bằng 1 lệnh DELETE (không đọc cả bảng ra Python)
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: Path, max_bytes: int, ttl_seconds: float):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self._touched: Dict[str, float] = {}  # key -> last_access chưa ghi xuống file
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_cache ("
+            " key TEXT PRIMARY KEY, probabilities BLOB NOT NULL,"
+            " size INTEGER NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_prediction_cache_last_access ON prediction_cache (last_access)"
+        )
+        self._size_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM prediction_cache"
+        ).fetchone()[0]
+
+    def get(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT probabilities, expires_at, size FROM prediction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            blob, expires_at, size = row
+            if self.ttl_seconds and expires_at < now:
+                self._conn.execute("DELETE FROM prediction_cache WHERE key = ?", (key,))
+                self._touched.pop(key, None)
+                self._size_bytes -= size
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_BATCH_SIZE:
+                self._flush_touches()
+            self.hits += 1
+            return _unpack(blob)
+
+    def _flush_touches(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE prediction_cache SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def set(self, key: str, probabilities: List[float]):
+        blob = _pack(probabilities)
+        size = len(key) + len(blob)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM prediction_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, probabilities, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, blob, size, now + self.ttl_seconds, now),
+            )
+            self._touched.pop(key, None)
+            self._size_bytes += size - (old[0] if old else 0)
+            if self._size_bytes > self.max_bytes:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        """Xoá entry hết hạn, sau đó xoá theo LRU tới khi còn ~90% max_bytes"""
+        self._flush_touches()
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM prediction_cache WHERE expires_at < ?", (now,))
+        target = int(self.max_bytes * 0.9)
+        size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM prediction_cache").fetchone()[0]
+        while size > target:
+            evicted = self._conn.execute(
+                "DELETE FROM prediction_cache WHERE key IN"
+                " (SELECT key FROM prediction_cache ORDER BY last_access LIMIT ?) RETURNING size",
+                (EVICT_BATCH_SIZE,),
+            ).fetchall()
+            if not evicted:
+                break
+            size -= sum(entry_size for (entry_size,) in evicted)
+            self.evictions += len(evicted)
+        self._size_bytes = size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM prediction_cache")
+            self._touched.clear()
+            self._size_bytes = 0
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "size_bytes": self._size_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class PredictionCache:
+    """
+    Cache probabilities theo hash nội dung ảnh + model version
+    - Các tầng backend được tra theo thứ tự (memory -> sqlite), hit ở tầng sau được đẩy lên tầng trước
+    - Tầng blocking (sqlite) chạy trên 1 thread riêng: get chờ qua run_in_executor, set là write-behind
+      (không chờ, thread ghi theo thứ tự nên get sau set vẫn thấy entry)
+    - Chỉ lưu raw probabilities nên threshold vẫn áp dụng riêng từng request
+    """
+
+    def __init__(self, backends: List[CacheBackend], model_version: Optional[str] = None):
+        self.backends = backends
+        self.model_version = model_version or "unknown"
+        self.hits = 0
+        self.misses = 0
+        self.dropped_writes = 0
+        self._pending_writes = 0
+        self._pending_lock = threading.Lock()
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._io_pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backends)
+
+    @staticmethod
+    def hash_content(image_bytes: bytes) -> str:
+        """Hash nội dung ảnh (blake2b 128 bit, hex) - client có thể tự tính để tra cache"""
+        return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+    def key_for_hash(self, content_hash: str) -> str:
+        return f"{self.model_version}:{content_hash.lower()}"
+
+    def make_key(self, image_bytes: bytes) -> str:
+        return self.key_for_hash(self.hash_content(image_bytes))
+
+    def key_for_url(self, url: str) -> str:
+        """Key cho kết quả theo URL ảnh (predict/url), tách namespace với key theo nội dung"""
+        url_hash = hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+        return f"{self.model_version}:url:{url_hash}"
+
+    def _get_io(self) -> ThreadPoolExecutor:
+        # Tạo lazy theo từng process: thread của master không còn sau khi fork worker
+        if self._io is None or self._io_pid != os.getpid():
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-cache")
+            self._io_pid = os.getpid()
+            self._pending_writes = 0
+        return self._io
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        for index, backend in enumerate(self.backends):
+            if backend.blocking:
+                probabilities = await asyncio.get_running_loop().run_in_executor(self._get_io(), backend.get, key)
+            else:
+                probabilities = backend.get(key)
+            if probabilities is not None:
+                for upper in self.backends[:index]:
+                    self._set_backend(upper, key, probabilities)
+                self.hits += 1
+                return probabilities
+        self.misses += 1
+        return None
+
+    def set(self, key: str, probabilities: List[float]):
+        for backend in self.backends:
+            self._set_backend(backend, key, probabilities)
+
+    def _set_backend(self, backend: CacheBackend, key: str, probabilities: List[float]):
+        if not backend.blocking:
+            backend.set(key, probabilities)
+            return
+        io = self._get_io()
+        with self._pending_lock:
+            if self._pending_writes >= MAX_PENDING_WRITES:
+                self.dropped_writes += 1
+                return
+            self._pending_writes += 1
+        io.submit(backend.set, key, probabilities).add_done_callback(self._write_done)
+
+    def _write_done(self, future):
+        with self._pending_lock:
+            self._pending_writes -= 1
+        if future.exception() is not None:
+            logger.warning(f"Prediction cache write failed: {future.exception()}")
+
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "model_version": self.model_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "pending_writes": self._pending_writes,
+            "dropped_writes": self.dropped_writes,
+            "tiers": [backend.stats() for backend in self.backends],
+        }
+
+
+def build_prediction_cache(model_version: Optional[str]) -> PredictionCache:
+    """Tạo PredictionCache theo settings (PREDICTION_CACHE_*)"""
+    backends: List[CacheBackend] = []
+    if settings.PREDICTION_CACHE_ENABLED:
+        backends.append(MemoryCacheBackend(
+            max_bytes=settings.PREDICTION_CACHE_MAX_BYTES,
+            ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+        ))
+        if settings.PREDICTION_CACHE_SQLITE_PATH:
+            sqlite_path = Path(settings.PREDICTION_CACHE_SQLITE_PATH)
+            if not sqlite_path.is_absolute():
+                sqlite_path = BACKEND_ROOT / sqlite_path
+            backends.append(SQLiteCacheBackend(
+                path=sqlite_path,
+                max_bytes=settings.PREDICTION_CACHE_SQLITE_MAX_BYTES,
+                ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS,
+            ))
+    return PredictionCache(backends, model_version=model_version)
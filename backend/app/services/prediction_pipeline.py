@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+from app.services.image_fetcher import ImageFetcher, normalize_url
+from app.services.inference_batcher import InferenceBatcher
+from app.services.memory_governor import DecodeMemoryGovernor, estimate_decoded_bytes
+from app.services.perceptual_index import PerceptualHashIndex, dhash_from_grayscale, load_grayscale
+from app.services.prediction_cache import PredictionCache
+from app.services.metrics import PREDICTIONS_COALESCED
+from app.services.triage import ImageTriage, TriageProbabilities
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class PredictionPipeline:
+    """
+    Luồng lấy raw probabilities cho 1 ảnh: cache -> triage -> perceptual hash index -> batcher (MobileNetV2)
+    - Cache hit bỏ qua hoàn toàn decode, transform và forward
+    - Triage: ảnh hiển nhiên an toàn (icon, placeholder 1 màu...) trả probabilities = 0, bỏ qua forward
+    - Ảnh gần giống (Hamming distance dHash nhỏ) dùng lại probabilities, bỏ qua forward
+    - Single-flight: request trùng content hash (hoặc URL) với 1 request đang chạy chờ chung kết quả của nó
+    - Decode (dHash + batcher) chỉ bắt đầu khi memory governor còn budget cho ảnh đã decode
+    Kết quả là raw probabilities nên mỗi request vẫn áp threshold riêng.
+    """
+
+    def __init__(
+        self,
+        batcher: InferenceBatcher,
+        cache: PredictionCache,
+        phash_index: Optional[PerceptualHashIndex] = None,
+        memory_governor: Optional[DecodeMemoryGovernor] = None,
+        triage: Optional[ImageTriage] = None,
+    ):
+        self.batcher = batcher
+        self.cache = cache
+        self.phash_index = phash_index
+        self.memory_governor = memory_governor
+        self.triage = triage
+        self._audits = set()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.requests = 0
+        self.coalesced = 0
+
+    async def get_cached_probabilities(self, content_hash: str) -> Optional[List[float]]:
+        """Tra cache theo content hash client gửi lên (không cần upload lại ảnh)"""
+        if not self.cache.enabled:
+            return None
+        return await self.cache.get(self.cache.key_for_hash(content_hash))
+
+    async def get_probabilities(self, image_bytes: bytes) -> List[float]:
+        self.requests += 1
+        return await self._probabilities_for_bytes(image_bytes)
+
+    async def _probabilities_for_bytes(self, image_bytes: bytes) -> List[float]:
+        content_hash = self.cache.hash_content(image_bytes)
+        cache_key = self.cache.key_for_hash(content_hash) if self.cache.enabled else None
+        if cache_key:
+            probabilities = await self.cache.get(cache_key)
+            if probabilities is not None:
+                return probabilities
+
+        return await self._single_flight(content_hash, lambda: self._compute(image_bytes, cache_key))
+
+    async def get_probabilities_for_url(self, url: str, fetcher: ImageFetcher) -> List[float]:
+        """
+        Probabilities cho ảnh tại URL: tra cache theo URL trước, chỉ tải + predict khi miss
+        URL giống nhau giữa các user / request đồng thời chỉ được tải và phân loại 1 lần.
+        """
+        self.requests += 1
+        url = normalize_url(url)
+        url_key = self.cache.key_for_url(url) if self.cache.enabled else None
+        if url_key:
+            probabilities = await self.cache.get(url_key)
+            if probabilities is not None:
+                return probabilities
+
+        async def fetch_and_predict() -> List[float]:
+            image_bytes = await fetcher.fetch(url)
+            probabilities = await self._probabilities_for_bytes(image_bytes)
+            if url_key and not isinstance(probabilities, TriageProbabilities):
+                self.cache.set(url_key, probabilities)
+            return probabilities
+
+        return await self._single_flight(f"url:{url}", fetch_and_predict)
+
+    async def _single_flight(self, key: str, compute: Callable[[], Awaitable[List[float]]]) -> List[float]:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            PREDICTIONS_COALESCED.inc()
+        else:
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # shield: 1 request bị hủy (client ngắt kết nối) không hủy phép tính của các request khác
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Đánh dấu đã lấy exception khi mọi request chờ đều đã bị hủy
+
+    async def _compute(self, image_bytes: bytes, cache_key: Optional[str]) -> List[float]:
+        if self.memory_governor is None:
+            return await self._decode_and_predict(image_bytes, cache_key)
+        decoded_bytes = estimate_decoded_bytes(image_bytes, settings.MODEL_IMG_SIZE)
+        async with self.memory_governor.reserve(decoded_bytes):
+            return await self._decode_and_predict(image_bytes, cache_key)
+
+    def _inspect(self, image_bytes: bytes) -> Tuple[Optional[int], Optional[str]]:
+        """(dHash, lý do triage bỏ qua) từ cùng 1 lần decode ảnh xám cỡ nhỏ, chạy trong executor"""
+        loaded = load_grayscale(image_bytes)
+        if loaded is None:
+            return None, None  # Decoder của model sẽ báo lỗi định dạng
+        gray, size = loaded
+        reason = self.triage.evaluate(gray, size) if self.triage is not None else None
+        if reason is not None or self.phash_index is None:
+            return None, reason
+        return dhash_from_grayscale(gray), None
+
+    async def _decode_and_predict(self, image_bytes: bytes, cache_key: Optional[str]) -> List[float]:
+        image_hash = None
+        if self.phash_index is not None or self.triage is not None:
+            image_hash, reason = await asyncio.get_running_loop().run_in_executor(None, self._inspect, image_bytes)
+            if reason is not None:
+                if self.triage.should_audit():
+                    self._start_audit(image_bytes, reason)
+                # Không cache: key chỉ theo nội dung ảnh, đổi ngưỡng triage thì kết quả cũ không còn đúng
+                return self.triage.skip_result()
+            if image_hash is not None:
+                probabilities = self.phash_index.lookup(image_hash)
+                if probabilities is not None:
+                    if cache_key:
+                        self.cache.set(cache_key, probabilities)
+                    return probabilities
+
+        probabilities = await self.batcher.submit(image_bytes)
+
+        if cache_key:
+            self.cache.set(cache_key, probabilities)
+        if image_hash is not None:
+            self.phash_index.add(image_hash, probabilities)
+        return probabilities
+
+    def _start_audit(self, image_bytes: bytes, reason: str):
+        """Chạy inference thật cho ảnh triage đã bỏ qua ở background (không làm chậm response)"""
+        async def audit():
+            try:
+                self.triage.record_audit(reason, await self.batcher.submit(image_bytes))
+            except Exception as e:
+                logger.debug(f"Triage audit skipped: {e}")
+
+        task = asyncio.ensure_future(audit())
+        self._audits.add(task)
+        task.add_done_callback(self._audits.discard)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": self.coalesced / self.requests if self.requests else 0.0,
+            "in_flight": self.in_flight,
+        }
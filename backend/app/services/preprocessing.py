@@ -0,0 +1,69 @@
+import threading
+from typing import List, Sequence, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+class BatchPreprocessor:
+    """
+    Chuyển list ảnh PIL (RGB) thành tensor batch đã normalize, thay cho transforms.Compose từng ảnh
+    - Nhận thêm mảng uint8 HWC đã đúng size x size (ảnh client resize sẵn): ghi thẳng, không resize
+    - Resize từng ảnh (PIL bilinear, giống transforms.Resize) rồi ghi thẳng vào buffer uint8 NHWC
+    - Normalize cả batch trong 1 lượt vectorized: x * (1 / (255 * std)) - mean / std
+    - Output là tensor NCHW với memory format channels-last (view trên buffer NHWC, không cần permute copy)
+    - Buffer được cấp phát trước và dùng lại giữa các lần gọi, riêng cho từng worker thread
+    Tensor trả về là view trên buffer: phải dùng xong (forward) trước lần gọi kế tiếp trên cùng thread.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        mean: Sequence[float] = IMAGENET_MEAN,
+        std: Sequence[float] = IMAGENET_STD,
+        initial_batch_size: int = 1,
+    ):
+        self.size = size
+        std_tensor = torch.tensor(std, dtype=torch.float32)
+        self._scale = (1.0 / (255.0 * std_tensor)).view(1, 3, 1, 1)
+        self._shift = (torch.tensor(mean, dtype=torch.float32) / std_tensor).view(1, 3, 1, 1)
+        self.initial_batch_size = max(1, initial_batch_size)
+        self._local = threading.local()
+
+    def _buffers(self, batch_size: int):
+        """Lấy buffer (uint8 NHWC, float32 NHWC) của thread hiện tại, nới rộng khi batch lớn hơn"""
+        capacity = getattr(self._local, "capacity", 0)
+        if capacity < batch_size:
+            capacity = max(batch_size, self.initial_batch_size, capacity * 2)
+            self._local.pixels = np.empty((capacity, self.size, self.size, 3), dtype=np.uint8)
+            with torch.inference_mode():
+                self._local.normalized = torch.empty((capacity, self.size, self.size, 3), dtype=torch.float32)
+            self._local.capacity = capacity
+        return self._local.pixels, self._local.normalized
+
+    def __call__(self, images: List[Union[Image.Image, np.ndarray]]) -> torch.Tensor:
+        batch_size = len(images)
+        pixels, normalized = self._buffers(batch_size)
+        target = (self.size, self.size)
+
+        for index, image in enumerate(images):
+            if isinstance(image, np.ndarray):
+                if image.shape[:2] == target:
+                    pixels[index] = image
+                    continue
+                image = Image.fromarray(image)  # Preprocessor khác size (first pass của cascade)
+            if image.size != target:
+                image = image.resize(target, Image.BILINEAR)
+            pixels[index] = np.asarray(image)
+
+        # NHWC -> NCHW view (channels-last), convert uint8 -> float32 in-place vào buffer
+        # Luôn ghi trong inference_mode: buffer tạo lần đầu dưới inference_mode (warmup) là inference tensor
+        with torch.inference_mode():
+            out = normalized[:batch_size].permute(0, 3, 1, 2)
+            out.copy_(torch.from_numpy(pixels[:batch_size]).permute(0, 3, 1, 2))
+            out.mul_(self._scale).sub_(self._shift)
+        return out
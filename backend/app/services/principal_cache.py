@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Set, Tuple
+
+from app.config import get_settings
+from app.services.metrics import AUTH_PRINCIPAL_LOOKUPS, metrics
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class Principal:
+    """User đã xác thực, đủ cho kiểm tra quyền mà không cần đọc bảng users"""
+    user_id: int
+    is_active: bool
+    is_admin: bool
+
+
+class PrincipalCache:
+    """
+    Cache in-process token -> Principal để request đã xác thực không cần mở DB session
+    - Entry sống tối đa ttl_s và không quá thời điểm hết hạn của JWT
+    - invalidate_user khi admin khóa / đổi quyền user; ttl_s là giới hạn độ cũ khi đổi ở process khác
+    - LRU, tối đa max_entries token
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.AUTH_PRINCIPAL_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()  # token -> (principal, expires_at)
+        self._tokens_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[Principal]:
+        if self.ttl_seconds <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] < time.time():
+                self._remove(token)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(token)
+        AUTH_PRINCIPAL_LOOKUPS.inc(result="hit" if entry else "miss")
+        return entry[0] if entry else None
+
+    def put(self, token: str, principal: Principal, token_expires_at: Optional[float] = None):
+        if self.ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._remove(token)
+            self._entries[token] = (principal, expires_at)
+            self._tokens_by_user.setdefault(principal.user_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, token: str):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[0].user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0].user_id]
+
+    def invalidate_user(self, user_id: int):
+        """Bỏ mọi token đã cache của user (khóa tài khoản, đổi quyền admin, xóa user)"""
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+
+principal_cache = PrincipalCache()
+
+metrics.gauge("xdynamic_auth_principal_cache_entries", "Verified tokens cached with their user's active/admin flags",
+              lambda: len(principal_cache))
@@ -0,0 +1,16 @@
+from typing import Union
+
+import numpy as np
+
+
+def rgb_payload_size(size: int) -> int:
+    """Số byte của ảnh RGB uint8 size x size đã resize sẵn ở client"""
+    return size * size * 3
+
+
+def rgb_payload_to_array(payload: Union[bytes, bytearray], size: int) -> np.ndarray:
+    """View (không copy) HWC uint8 trên payload RGB đã resize sẵn; raise ValueError nếu sai kích thước"""
+    expected = rgb_payload_size(size)
+    if len(payload) != expected:
+        raise ValueError(f"RGB payload must be exactly {expected} bytes ({size}x{size}x3 uint8)")
+    return np.frombuffer(payload, dtype=np.uint8).reshape(size, size, 3)
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.config import get_settings
+from app.services.metrics import SUBSCRIPTION_CACHE_HIT_AGE_SECONDS, SUBSCRIPTION_CACHE_LOOKUPS, metrics
+
+settings = get_settings()
+
+
+@dataclass(frozen=True)
+class CachedSubscription:
+    subscription_id: int
+    plan: str
+    monthly_quota: int
+    expires_at: Optional[datetime]
+    cached_at: float  # time.monotonic() lúc đọc từ DB
+
+
+class ActiveSubscriptionCache:
+    """
+    Cache in-process gói đang active của từng user (id, plan, monthly quota, ngày hết hạn)
+    để đường predict không phải query subscription (OR status + ORDER BY created_at)
+    - used_quota không cache: quota luôn được giữ bằng UPDATE có điều kiện trên DB
+    - Invalidate khi mua / hủy gói, gói hết hạn, admin đổi user; entry quá ttl_s bị bỏ
+      -> ttl_s là giới hạn độ cũ khi thay đổi đến từ process khác
+    - LRU, tối đa max_entries user
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.SUBSCRIPTION_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.SUBSCRIPTION_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[int, CachedSubscription]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[CachedSubscription]:
+        """Entry còn hạn của user; None nếu chưa có, quá TTL hoặc gói đã hết hạn (cần đi qua DB để downgrade)"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                result = "miss"
+            elif now - entry.cached_at > self.ttl_seconds:
+                result = "stale"
+            elif entry.expires_at and entry.expires_at < datetime.utcnow():
+                result = "expired"
+            else:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                result = "hit"
+            if result != "hit":
+                self._entries.pop(user_id, None)
+                self.misses += 1
+        SUBSCRIPTION_CACHE_LOOKUPS.inc(result=result)
+        if result != "hit":
+            return None
+        SUBSCRIPTION_CACHE_HIT_AGE_SECONDS.observe(now - entry.cached_at)
+        return entry
+
+    def put(self, user_id: int, subscription) -> CachedSubscription:
+        entry = CachedSubscription(
+            subscription_id=subscription.id,
+            plan=subscription.plan.value if hasattr(subscription.plan, "value") else subscription.plan,
+            monthly_quota=subscription.monthly_quota,
+            expires_at=subscription.expires_at,
+            cached_at=time.monotonic(),
+        )
+        if self.enabled:
+            with self._lock:
+                self._entries[user_id] = entry
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+subscription_cache = ActiveSubscriptionCache()
+
+metrics.gauge("xdynamic_subscription_cache_entries", "Users whose active subscription is cached in-process",
+              lambda: len(subscription_cache))
+metrics.gauge("xdynamic_subscription_cache_ttl_seconds", "Upper bound on how stale a cached subscription can be",
+              lambda: subscription_cache.ttl_seconds)
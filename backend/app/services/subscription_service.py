@@ -8,9 +8,13 @@ from app.repositories.subscription_repository import SubscriptionRepository
 from app.repositories.transaction_repository import TransactionRepository
 from app.models.subscription import Subscription, PlanType, SubscriptionStatus
 from app.models.transaction import TransactionType, TransactionStatus
+from app.services.subscription_cache import subscription_cache
 
 settings = get_settings()
 
+# Số lần thử giữ quota khi batch chỉ giữ được một phần (quota bị request song song tiêu mất)
+QUOTA_RESERVE_ATTEMPTS = 3
+
 
 class SubscriptionService:
     """Service quản lý subscription (FREE/PLUS/PRO), check quota, mua gói"""
@@ -34,7 +38,7 @@ class SubscriptionService:
     
     def get_active_subscription(self, user_id: int) -> Optional[Subscription]:
         """
-        Lấy gói subscription đang active của user
+        Lấy gói subscription đang active của user (query DB, cập nhật subscription_cache)
         - CANCELLED subscription: User vẫn dùng đến hết hạn
         - EXPIRED: Tự động chuyển về FREE
         """
@@ -46,11 +50,15 @@ class SubscriptionService:
             # Auto-downgrade to FREE if was ACTIVE or CANCELLED
             if subscription.status in (SubscriptionStatus.ACTIVE, SubscriptionStatus.CANCELLED):
                 self.subscription_repo.update_status(subscription.id, SubscriptionStatus.EXPIRED)
-                return self.subscription_repo.create(
+                subscription = self.subscription_repo.create(
                     user_id=user_id, plan=PlanType.FREE,
                     monthly_quota=settings.PLAN_FREE_MONTHLY_QUOTA
                 )
         
+        if subscription:
+            subscription_cache.put(user_id, subscription)
+        else:
+            subscription_cache.invalidate(user_id)
         return subscription
     
     def purchase_plan(self, user_id: int, plan: str) -> Subscription:
@@ -100,10 +108,12 @@ class SubscriptionService:
         if current_subscription:
             self.subscription_repo.update_status(current_subscription.id, SubscriptionStatus.CANCELLED)
         
-        return self.subscription_repo.create(
+        subscription = self.subscription_repo.create(
             user_id=user_id, plan=plan_type, monthly_quota=plan_details["quota"],
             expires_at=datetime.utcnow() + timedelta(days=30)
         )
+        subscription_cache.invalidate(user_id)
+        return subscription
     
     def cancel_subscription(self, user_id: int) -> Subscription:
         """
@@ -127,6 +137,7 @@ class SubscriptionService:
             monthly_quota=self.get_plan_details(PlanType.FREE)["quota"],
             expires_at=None  # FREE plan never expires
         )
+        subscription_cache.invalidate(user_id)
         
         return free_subscription  # Return new FREE subscription
     
@@ -136,6 +147,7 @@ class SubscriptionService:
         if subscription and subscription.expires_at and subscription.status == SubscriptionStatus.ACTIVE:
             if subscription.expires_at < datetime.utcnow():
                 self.subscription_repo.update_status(subscription.id, SubscriptionStatus.EXPIRED)
+                subscription_cache.invalidate(user_id)
     
     def check_quota(self, user_id: int) -> dict:
         """Kiểm tra user còn quota để gọi API hay không"""
@@ -153,7 +165,54 @@ class SubscriptionService:
             **({"reason": "Quota exceeded"} if remaining <= 0 else {})
         }
     
-    def increment_usage(self, subscription_id: int):
-        """Tăng số lần đã dùng API (dùng sau mỗi lần predict)"""
-        self.subscription_repo.increment_usage(subscription_id, 1)
-
+    def reserve_quota(self, user_id: int, count: int = 1, partial: bool = False) -> dict:
+        """
+        Giữ trước `count` đơn vị quota bằng 1 lệnh UPDATE có điều kiện (không race giữa các request song song)
+        - partial=True (batch predict): giữ được bao nhiêu thì giữ (tối đa count)
+        - Gói active lấy từ subscription_cache: trúng cache thì không query subscription
+        - Dùng trước inference; inference lỗi / client hủy -> release_quota phần chưa dùng
+        """
+        cached = subscription_cache.get(user_id)
+        reservation = self._reserve(user_id, cached.subscription_id if cached else None, count, partial)
+        if cached and not reservation["allowed"]:
+            # Entry có thể đã cũ (gói đổi / hết hạn ở process khác) -> kiểm tra lại bằng DB
+            subscription_cache.invalidate(user_id)
+            reservation = self._reserve(user_id, None, count, partial)
+        return reservation
+    
+    def _reserve(self, user_id: int, subscription_id: Optional[int], count: int, partial: bool) -> dict:
+        if subscription_id is None:
+            subscription = self.get_active_subscription(user_id)
+            if not subscription:
+                return {"allowed": False, "reason": "No active subscription", "remaining": 0, "reserved": 0}
+            subscription_id = subscription.id
+        
+        wanted = count
+        # Request song song có thể tiêu quota giữa lúc đọc remaining và UPDATE -> thử lại với remaining mới
+        for _ in range(QUOTA_RESERVE_ATTEMPTS):
+            remaining = self.subscription_repo.reserve_quota(subscription_id, wanted)
+            if remaining is not None:
+                return {
+                    "allowed": True,
+                    "remaining": remaining,
+                    "reserved": wanted,
+                    "subscription_id": subscription_id,
+                }
+            if not partial:
+                break
+            wanted = min(count, self.subscription_repo.get_remaining_quota(subscription_id))
+            if wanted <= 0:
+                break
+        
+        return {
+            "allowed": False,
+            "reason": "Quota exceeded",
+            "remaining": self.subscription_repo.get_remaining_quota(subscription_id),
+            "reserved": 0,
+            "subscription_id": subscription_id,
+        }
+    
+    def release_quota(self, subscription_id: int, count: int = 1):
+        """Trả lại quota đã giữ nhưng không dùng (inference lỗi, item batch lỗi)"""
+        if count > 0:
+            self.subscription_repo.release_quota(subscription_id, count)
@@ -0,0 +1,95 @@
+import logging
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.config import get_settings
+from app.services.metrics import TRIAGE_AUDITS, TRIAGE_DECISIONS
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TRIAGE_THUMBNAIL_SIZE = 32
+
+
+@dataclass
+class TriageStats:
+    width: int
+    height: int
+    stddev: float  # Độ lệch chuẩn độ sáng trên 32x32 pixel lấy mẫu
+    entropy: float  # Entropy (bit) histogram độ sáng trên 32x32 pixel lấy mẫu
+
+
+def compute_triage_stats(gray: Image.Image, size: Tuple[int, int]) -> TriageStats:
+    # NEAREST lấy mẫu pixel thật: resize có lọc làm mịn texture chi tiết thành ảnh gần như phẳng
+    thumbnail = np.asarray(gray.resize((TRIAGE_THUMBNAIL_SIZE, TRIAGE_THUMBNAIL_SIZE), Image.NEAREST))
+    histogram = np.bincount(thumbnail.ravel(), minlength=256) / thumbnail.size
+    histogram = histogram[histogram > 0]
+    return TriageStats(
+        width=size[0],
+        height=size[1],
+        stddev=float(thumbnail.std()),
+        entropy=float(-(histogram * np.log2(histogram)).sum()),
+    )
+
+
+class TriageProbabilities(list):
+    """Kết quả an toàn của ảnh bị triage bỏ qua: không ghi vào cache (chỉ đúng với cấu hình triage hiện tại)"""
+
+
+class ImageTriage:
+    """
+    Phân loại nhanh trước inference: ảnh không thể chứa các class của model (icon, spacer GIF,
+    placeholder 1 màu, avatar tí hon) được trả kết quả an toàn (probabilities = 0) mà không cần forward
+    - Chỉ dùng thống kê rẻ: kích thước gốc, độ lệch chuẩn và entropy độ sáng trên 32x32 pixel lấy mẫu
+    - audit_rate: tỉ lệ ảnh bị bỏ qua vẫn được chạy inference ở background để đối chiếu,
+      kết quả ghi vào counter xdynamic_triage_audits_total (agree / disagree)
+    """
+
+    def __init__(
+        self,
+        min_side: Optional[int] = None,
+        min_stddev: Optional[float] = None,
+        min_entropy: Optional[float] = None,
+        audit_rate: Optional[float] = None,
+    ):
+        self.min_side = min_side if min_side is not None else settings.TRIAGE_MIN_SIDE
+        self.min_stddev = min_stddev if min_stddev is not None else settings.TRIAGE_MIN_STDDEV
+        self.min_entropy = min_entropy if min_entropy is not None else settings.TRIAGE_MIN_ENTROPY
+        self.audit_rate = audit_rate if audit_rate is not None else settings.TRIAGE_AUDIT_SAMPLE_RATE
+        self.safe_probabilities: List[float] = [0.0] * len(settings.MODEL_CLASSES)
+
+    def skip_reason(self, stats: TriageStats) -> Optional[str]:
+        """Lý do bỏ qua inference (tiny / flat / low_entropy), None nếu ảnh cần chạy model"""
+        if min(stats.width, stats.height) < self.min_side:
+            return "tiny"
+        if stats.stddev < self.min_stddev:
+            return "flat"
+        if stats.entropy < self.min_entropy:
+            return "low_entropy"
+        return None
+
+    def evaluate(self, gray: Image.Image, size: Tuple[int, int]) -> Optional[str]:
+        """Chạy trong executor (resize thumbnail); ghi counter theo quyết định"""
+        reason = self.skip_reason(compute_triage_stats(gray, size))
+        TRIAGE_DECISIONS.inc(verdict=reason or "pass")
+        return reason
+
+    def skip_result(self) -> TriageProbabilities:
+        return TriageProbabilities(self.safe_probabilities)
+
+    def should_audit(self) -> bool:
+        return self.audit_rate > 0 and random.random() < self.audit_rate
+
+    def record_audit(self, reason: str, probabilities: List[float]):
+        """So kết quả inference thật của ảnh đã bị bỏ qua với threshold mặc định"""
+        flagged = [
+            cls for cls, prob in zip(settings.MODEL_CLASSES, probabilities)
+            if prob >= settings.TRIAGE_AUDIT_THRESHOLD
+        ]
+        TRIAGE_AUDITS.inc(outcome="disagree" if flagged else "agree", reason=reason)
+        if flagged:
+            logger.warning(f"Triage skipped an image ({reason}) that the model flags as {flagged}")
@@ -0,0 +1,248 @@
+import io
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from fastapi import UploadFile
+from PIL import Image
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+READ_CHUNK_BYTES = 64 * 1024
+# Đủ cho header của hầu hết ảnh (JPEG có EXIF / ICC lớn có thể cần nhiều hơn -> bỏ qua kiểm tra sớm)
+SNIFF_BYTES = 64 * 1024
+# Phần body multipart không thuộc file ảnh (boundary, header của part, field khác) tối đa
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+ImageBuffer = Union[bytes, bytearray, memoryview]
+
+
+class UploadRejectedError(Exception):
+    """Upload bị từ chối khi đang đọc; status_code là mã HTTP nên trả cho client"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BufferReader(io.RawIOBase):
+    """File-like chỉ đọc trên 1 buffer có sẵn: PIL đọc thẳng từ buffer, không copy cả ảnh như io.BytesIO"""
+
+    def __init__(self, buffer: ImageBuffer):
+        super().__init__()
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._pos + size, len(self._view))
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self._pos = offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def open_image(buffer: ImageBuffer) -> Image.Image:
+    """Image.open (chỉ đọc header) trên bytes / bytearray / memoryview mà không copy buffer"""
+    if isinstance(buffer, bytes):
+        return Image.open(io.BytesIO(buffer))  # BytesIO dùng chung bộ nhớ với bytes bất biến
+    return Image.open(BufferReader(buffer))
+
+
+def is_webp(head: ImageBuffer) -> bool:
+    """Chữ ký RIFF....WEBP"""
+    head = bytes(head[:12])
+    return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+
+
+def sniff_webp_size(head: ImageBuffer) -> Optional[Tuple[int, int]]:
+    """
+    (width, height) từ chunk đầu tiên của WebP (VP8 / VP8L / VP8X)
+    Plugin WebP của PIL đọc cả file mới mở được -> không sniff được trên phần đầu file
+    """
+    head = bytes(head[:30])
+    if len(head) < 30 or not is_webp(head):
+        return None
+    chunk = head[12:16]
+    if chunk == b"VP8X":
+        return 1 + int.from_bytes(head[24:27], "little"), 1 + int.from_bytes(head[27:30], "little")
+    if chunk == b"VP8L" and head[20] == 0x2F:
+        bits = int.from_bytes(head[21:25], "little")
+        return 1 + (bits & 0x3FFF), 1 + ((bits >> 14) & 0x3FFF)
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        return int.from_bytes(head[26:28], "little") & 0x3FFF, int.from_bytes(head[28:30], "little") & 0x3FFF
+    return None
+
+
+def sniff_image(head: ImageBuffer) -> Optional[Tuple[str, int, int]]:
+    """(format, width, height) đọc từ phần đầu file, None nếu header chưa đủ / không nhận ra"""
+    try:
+        image = open_image(head)
+        return image.format, image.size[0], image.size[1]
+    except Exception:
+        pass
+    size = sniff_webp_size(head)
+    return ("WEBP", *size) if size else None
+
+
+async def iter_upload(upload: UploadFile, chunk_size: int = READ_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def iter_multipart_file(
+    chunks: AsyncIterator[bytes], content_type: str, field_name: str = "file"
+) -> AsyncIterator[bytes]:
+    """
+    Data của part field_name trong body multipart/form-data, theo từng chunk ngay khi body đang được nhận
+    (UploadFile: Starlette parse + spool cả body trước khi handler chạy -> không kiểm tra header ảnh sớm được)
+    - Dừng đọc body khi part đó kết thúc; data của các part khác bị bỏ qua
+    - Boundary, header và field thường (không phải file) vượt MULTIPART_OVERHEAD_BYTES -> 413
+    - File gửi dưới tên part khác không tính vào phần đó (body đã bị giới hạn bởi UploadLimitMiddleware):
+      không có part field_name -> 422
+    """
+    media_type, options = parse_options_header(content_type or "")
+    boundary = options.get(b"boundary")
+    if media_type != b"multipart/form-data" or not boundary:
+        raise UploadRejectedError(f"Expected multipart/form-data with a '{field_name}' field", status_code=422)
+
+    target = field_name.encode()
+    part = {"headers": [], "header_field": b"", "header_value": b"", "target": False, "other_file": False, "done": False}
+    data: List[bytes] = []
+    skipped = [0]
+
+    def on_part_begin():
+        part.update(headers=[], target=False, other_file=False)
+
+    def on_header_field(buffer: bytes, start: int, end: int):
+        part["header_field"] += buffer[start:end]
+
+    def on_header_value(buffer: bytes, start: int, end: int):
+        part["header_value"] += buffer[start:end]
+
+    def on_header_end():
+        part["headers"].append((part["header_field"].lower(), part["header_value"]))
+        part.update(header_field=b"", header_value=b"")
+
+    def on_headers_finished():
+        disposition = parse_options_header(dict(part["headers"]).get(b"content-disposition", b""))[1]
+        part["target"] = not part["done"] and disposition.get(b"name") == target
+        part["other_file"] = not part["target"] and b"filename" in disposition
+
+    def on_part_data(buffer: bytes, start: int, end: int):
+        if part["target"]:
+            data.append(buffer[start:end])
+        elif part["other_file"]:
+            skipped[0] += end - start
+
+    def on_part_end():
+        if part["target"]:
+            part["done"] = True
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    overhead = 0
+    async for chunk in chunks:
+        try:
+            parser.write(chunk)
+        except Exception:
+            raise UploadRejectedError("Malformed multipart body")
+        file_bytes = sum(len(piece) for piece in data)
+        overhead += len(chunk) - file_bytes - skipped[0]
+        skipped[0] = 0
+        if overhead > MULTIPART_OVERHEAD_BYTES:
+            raise UploadRejectedError("Multipart body has too much non-file data", status_code=413)
+        for piece in data:
+            yield piece
+        data.clear()
+        if part["done"]:
+            return
+    raise UploadRejectedError(f"Missing '{field_name}' field in multipart body", status_code=422)
+
+
+class UploadReader:
+    """
+    Đọc body / file upload theo từng chunk vào 1 buffer duy nhất
+    - Vượt max_bytes -> dừng đọc ngay (413), biết trước kích thước thì cấp phát buffer 1 lần
+    - max_pixels: đọc header ở SNIFF_BYTES đầu tiên, từ chối ảnh quá lớn trước khi nhận phần còn lại
+      (file nhỏ hơn SNIFF_BYTES không phải ảnh -> 400; header không nhận ra -> để decoder quyết định)
+    - Trả về memoryview trên buffer để giao thẳng cho decoder (open_image), không copy thêm
+    """
+
+    def __init__(self, max_bytes: int, max_pixels: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    def _too_large(self) -> UploadRejectedError:
+        return UploadRejectedError(f"Upload too large (max {self.max_bytes} bytes)", status_code=413)
+
+    def _check_header(self, head: bytes, complete: bool):
+        info = sniff_image(head)
+        if info is None:
+            # Header có thể nằm sau SNIFF_BYTES (JPEG nhiều metadata, định dạng PIL cần cả file mới mở được):
+            # chưa đọc hết file thì để decoder đầy đủ quyết định, chỉ từ chối khi đã có cả file
+            if complete:
+                raise UploadRejectedError("Invalid image format")
+            return
+        _, width, height = info
+        if width * height > self.max_pixels:
+            raise UploadRejectedError(
+                f"Image too large ({width}x{height}), max {self.max_pixels} pixels", status_code=413
+            )
+
+    async def read(self, chunks: AsyncIterator[bytes], expected_size: Optional[int] = None) -> memoryview:
+        if expected_size is not None and expected_size > self.max_bytes:
+            raise self._too_large()
+        buffer = bytearray(expected_size or 0)
+        size = 0
+        sniffed = self.max_pixels is None
+
+        async for chunk in chunks:
+            end = size + len(chunk)
+            if end > self.max_bytes:
+                raise self._too_large()
+            if expected_size is None:
+                buffer += chunk  # bytearray tăng dung lượng theo cấp số nhân
+            elif end > expected_size:
+                raise UploadRejectedError("Body longer than Content-Length")
+            else:
+                buffer[size:end] = chunk
+            size = end
+            if not sniffed and size >= SNIFF_BYTES:
+                self._check_header(bytes(buffer[:SNIFF_BYTES]), complete=False)
+                sniffed = True
+
+        if expected_size is not None and size != expected_size:
+            raise UploadRejectedError("Body shorter than Content-Length")
+        if not sniffed and size:
+            self._check_header(bytes(buffer), complete=True)
+        return memoryview(buffer)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import get_settings
+from app.database import SessionLocal
+from app.repositories.usage_log_repository import UsageLogRepository
+from app.services.metrics import USAGE_LOG_DROPPED, USAGE_LOG_FLUSH_SECONDS, metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def prediction_outcome(classes: List[str], probabilities: List[float], active: List[str], model_version: str) -> Dict:
+    """
+    Các cột kết quả predict của UsageLog (thay cho JSON trong meta_data)
+    - active_mask: bit i bật nếu classes[i] vượt threshold của request
+    - probabilities_q: 1 byte / class (lượng tử hóa 0-255)
+    """
+    active_set = set(active)
+    return {
+        "blocked": not active,
+        "active_mask": sum(1 << index for index, cls in enumerate(classes) if cls in active_set),
+        "probabilities_q": bytes(min(255, max(0, round(prob * 255))) for prob in probabilities),
+        "model_version": model_version,
+    }
+
+
+class UsageLogWriter:
+    """
+    Ghi usage log kiểu write-behind: request predict chỉ thêm 1 record vào buffer in-process,
+    task nền gom thành batch và ghi bằng 1 lệnh bulk insert / 1 transaction
+    - Flush khi buffer đủ batch_size hoặc sau flush_interval_s kể từ lần flush trước
+    - created_at lấy lúc request xảy ra, không phải lúc flush
+    - Ghi lỗi -> giữ lại để thử lần sau; buffer vượt max_pending -> bỏ record cũ nhất (đếm ở /metrics)
+    - stop() (lifespan shutdown) báo task nền dừng sau lần flush đang chạy (không cancel giữa chừng
+      -> batch đang ghi không bị mất), rồi flush nốt phần còn lại
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval_s: Optional[float] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.batch_size = max(1, batch_size or settings.USAGE_LOG_BATCH_SIZE)
+        self.flush_interval_s = flush_interval_s or settings.USAGE_LOG_FLUSH_INTERVAL_SECONDS
+        self.max_pending = max(self.batch_size, max_pending or settings.USAGE_LOG_MAX_PENDING)
+        self._pending: List[Dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def _ensure_worker(self):
+        """Khởi động task flush trên event loop hiện tại (lazy, như InferenceBatcher)"""
+        if self._worker is None or self._worker.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, **record):
+        """Thêm 1 usage log (các cột của UsageLog), không chặn request"""
+        self.submit_many([record])
+
+    def submit_many(self, records: List[Dict]):
+        self._ensure_worker()
+        now = datetime.utcnow()
+        for record in records:
+            record.setdefault("created_at", now)
+        self._pending.extend(records)
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            USAGE_LOG_DROPPED.inc(overflow)
+            logger.warning(f"Usage log buffer full, dropped {overflow} oldest records")
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            await self.flush()
+
+    async def flush(self):
+        """Ghi toàn bộ buffer theo từng batch; batch lỗi được trả lại đầu buffer"""
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:len(batch)]
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"Usage log flush failed ({len(batch)} records), will retry: {e}")
+                self._pending[:0] = batch
+                return
+            USAGE_LOG_FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _write(batch: List[Dict]):
+        db = SessionLocal()
+        try:
+            UsageLogRepository(db).create_many(batch)
+        finally:
+            db.close()
+
+    async def stop(self):
+        """Dừng task nền (chờ lần flush đang chạy xong) và flush phần còn lại (gọi khi shutdown)"""
+        if self._worker is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._worker
+            self._worker = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"Lost {len(self._pending)} usage log records on shutdown")
+
+
+usage_log_writer = UsageLogWriter()
+
+metrics.gauge("xdynamic_usage_log_queue_depth", "Usage-log records buffered for the next write-behind flush",
+              lambda: usage_log_writer.queue_depth)
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+# Số lần forward để profiling executor của TorchScript tối ưu xong graph (2 lần profiling + 1 lần đã tối ưu)
+PROFILING_RUNS = 3
+TUNING_BATCH_SIZES = (1, 4)
+TUNING_TIMED_RUNS = 2
+
+
+def _timed(forward: Callable[[torch.Tensor], torch.Tensor], inputs: List[torch.Tensor]) -> float:
+    """Latency trung bình (giây) trên các input sau khi đã chạy đủ lượt profiling"""
+    with torch.inference_mode():
+        for batch in inputs:
+            for _ in range(PROFILING_RUNS):
+                forward(batch)
+        start = time.perf_counter()
+        for batch in inputs:
+            for _ in range(TUNING_TIMED_RUNS):
+                forward(batch)
+    return (time.perf_counter() - start) / (len(inputs) * TUNING_TIMED_RUNS)
+
+
+@contextmanager
+def _torch_threads(threads: int):
+    """Đo tuning ở đúng số intra-op threads mà inference worker sẽ chạy"""
+    previous = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+def cpu_signature() -> str:
+    """Kiến trúc + ISA mà kernel torch dùng (+ digest cờ CPU nếu đọc được): artifact tuning không dùng chéo host"""
+    signature = f"{platform.machine()}-{torch.backends.cpu.get_cpu_capability()}"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = next((line for line in f if line.startswith(("flags", "Features"))), "")
+    except OSError:
+        flags = ""
+    if flags:
+        signature += "-" + hashlib.sha256(" ".join(sorted(flags.split(":", 1)[-1].split())).encode()).hexdigest()[:8]
+    return signature
+
+
+def _freeze(model: nn.Module, example: torch.Tensor, channels_last: bool) -> torch.jit.ScriptModule:
+    model = model.to(memory_format=torch.channels_last if channels_last else torch.contiguous_format)
+    with torch.no_grad():
+        return torch.jit.freeze(torch.jit.trace(model, example))
+
+
+class WarmStartCache:
+    """
+    Cache artifact khởi động nhanh cho model fp32 (MODEL_BACKEND=eager), lưu trong data volume
+    - Key: hash file weights + kích thước ảnh + phiên bản torch + số threads + CPU (đổi bất kỳ -> build lại)
+    - Artifact: module TorchScript đã trace + freeze, load thẳng không cần dựng nn.Module / load_state_dict
+    - Metadata: lựa chọn tuning đo ở lần build đầu (memory format của weights, optimize_for_inference)
+    - Build chỉ chạy trong process phục vụ (worker), không bao giờ ở master trước khi fork
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    @staticmethod
+    def make_key(weights_hash: str, img_size: int, threads: int) -> str:
+        torch_version = torch.__version__.replace("+", "_")
+        return f"{weights_hash}-{img_size}-torch{torch_version}-t{threads}-{cpu_signature()}"
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.root / f"{key}.pt", self.root / f"{key}.json"
+
+    def load(self, key: str) -> Optional[Callable[[torch.Tensor], torch.Tensor]]:
+        """Load artifact nếu có và hợp lệ; artifact hỏng bị xóa để lần sau build lại"""
+        artifact_path, meta_path = self._paths(key)
+        if not artifact_path.exists() or not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+            if meta.get("key") != key:
+                raise ValueError("metadata does not match artifact key")
+            module = torch.jit.load(str(artifact_path), map_location="cpu")
+            return self._apply_tuning(module, meta["tuning"])
+        except Exception as e:
+            logger.warning(f"Discarding warm-start artifact {artifact_path.name}: {e}")
+            artifact_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            return None
+
+    @staticmethod
+    def _apply_tuning(module: torch.jit.ScriptModule, tuning: Dict) -> Callable[[torch.Tensor], torch.Tensor]:
+        # Prepack oneDNN không serialize được nên áp dụng lại sau mỗi lần load
+        if tuning.get("optimize_for_inference"):
+            return torch.jit.optimize_for_inference(module)
+        return module
+
+    def build(self, key: str, model: nn.Module, img_size: int, threads: int) -> Callable[[torch.Tensor], torch.Tensor]:
+        """Đo các cấu hình ở `threads` intra-op threads, lưu artifact của cấu hình nhanh nhất, trả về forward"""
+        start = time.perf_counter()
+        example = torch.randn(1, 3, img_size, img_size).contiguous(memory_format=torch.channels_last)
+        # Input thật từ BatchPreprocessor luôn là channels-last
+        inputs = [
+            torch.randn(batch_size, 3, img_size, img_size).contiguous(memory_format=torch.channels_last)
+            for batch_size in TUNING_BATCH_SIZES
+        ]
+
+        best = None  # (latency, forward, tuning)
+        for channels_last in (True, False):
+            for optimize in (True, False):
+                tuning = {"channels_last": channels_last, "optimize_for_inference": optimize}
+                # optimize_for_inference sửa module tại chỗ: mỗi cấu hình freeze riêng
+                forward = self._apply_tuning(_freeze(model, example, channels_last), tuning)
+                with _torch_threads(threads):
+                    latency = _timed(forward, inputs)
+                tuning["latency_ms"] = round(latency * 1000, 3)
+                if best is None or latency < best[0]:
+                    best = (latency, forward, tuning)
+
+        _, forward, tuning = best
+        # Artifact lưu bản frozen chưa optimize (bản optimize không load lại được)
+        frozen = _freeze(model, example, tuning["channels_last"])
+        # Trả model về channels-last như lúc load
+        model.to(memory_format=torch.channels_last)
+        self._save(key, frozen, tuning)
+        logger.info(
+            f"Built warm-start artifact {key} in {time.perf_counter() - start:.2f}s "
+            f"(channels_last={tuning['channels_last']}, optimize_for_inference={tuning['optimize_for_inference']})"
+        )
+        return forward
+
+    def _save(self, key: str, module: torch.jit.ScriptModule, tuning: Dict):
+        artifact_path, meta_path = self._paths(key)
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            # Ghi file tạm rồi rename: process khác không bao giờ đọc phải artifact ghi dở
+            tmp_artifact = Path(f"{artifact_path}.{os.getpid()}.tmp")
+            torch.jit.save(module, str(tmp_artifact))
+            os.replace(tmp_artifact, artifact_path)
+            meta = {"key": key, "torch_version": torch.__version__, "created_at": time.time(), "tuning": tuning}
+            tmp_meta = Path(f"{meta_path}.{os.getpid()}.tmp")
+            tmp_meta.write_text(json.dumps(meta, indent=2))
+            os.replace(tmp_meta, meta_path)
+        except OSError as e:
+            logger.warning(f"Could not persist warm-start artifact {key}: {e}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark bộ nhớ: pre-fork cluster (run.py --cluster) vs multi-process thông thường (run.py --workers)
+Sử dụng: python benchmarks/bench_cluster.py [--workers 4] [--port 8765]
+
+Mỗi chế độ được khởi động như server thật, chờ đến khi mọi worker /ready, rồi đọc
+RSS / PSS / shared của từng process qua /proc/<pid>/smaps_rollup (chỉ chạy trên Linux).
+PSS chia đều trang nhớ dùng chung cho các process, nên tổng PSS là RAM thực sự tiêu tốn.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import BACKEND_ROOT
+from run import process_memory
+
+
+def _descendants(root_pid: int) -> list:
+    """Tất cả process con / cháu của root_pid (đọc ppid từ /proc/<pid>/stat)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    result, stack = [], [root_pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _wait_ready(port: int, workers: int, timeout_s: float) -> bool:
+    """Chờ đến khi /ready trả 200 liên tiếp đủ nhiều lần để chắc mọi worker đã load xong"""
+    deadline = time.monotonic() + timeout_s
+    streak = 0
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=2) as response:
+                streak = streak + 1 if response.status == 200 else 0
+        except Exception:
+            streak = 0
+        if streak >= workers * 4:
+            return True
+        time.sleep(0.1 if streak else 0.5)
+    return False
+
+
+def measure(mode: str, workers: int, port: int, timeout_s: float) -> dict:
+    command = [sys.executable, "run.py", "--skip-checks", "--port", str(port), "--workers", str(workers)]
+    if mode == "cluster":
+        command.append("--cluster")
+    process = subprocess.Popen(command, cwd=BACKEND_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not _wait_ready(port, workers, timeout_s):
+            raise RuntimeError(f"{mode}: server không sẵn sàng sau {timeout_s}s")
+        time.sleep(1)
+        processes = []
+        for pid in [process.pid] + _descendants(process.pid):
+            memory = process_memory(pid)
+            if memory["rss_mb"]:
+                processes.append({"pid": pid, **memory})
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    # Worker là các process nặng nhất (bỏ master / resource tracker)
+    worker_rows = sorted(processes, key=lambda p: p["rss_mb"], reverse=True)[:workers]
+    return {
+        "mode": mode,
+        "workers": workers,
+        "processes": processes,
+        "worker_rss_mb": sum(p["rss_mb"] for p in worker_rows) / len(worker_rows),
+        "worker_pss_mb": sum(p["pss_mb"] for p in worker_rows) / len(worker_rows),
+        "total_rss_mb": sum(p["rss_mb"] for p in processes),
+        "total_pss_mb": sum(p["pss_mb"] for p in processes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh RSS/PSS: pre-fork cluster vs multi-process")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=180.0, help="Thời gian chờ model load (giây)")
+    parser.add_argument("--json", type=Path, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("[ERROR] Cần Linux (/proc/<pid>/smaps_rollup)")
+        sys.exit(1)
+
+    results = [measure(mode, args.workers, args.port, args.timeout) for mode in ("naive", "cluster")]
+
+    print(f"{'mode':<8} {'workers':>7} {'worker RSS':>11} {'worker PSS':>11} {'total RSS':>10} {'total PSS':>10}")
+    for r in results:
+        print(
+            f"{r['mode']:<8} {r['workers']:>7} {r['worker_rss_mb']:>9.1f}MB {r['worker_pss_mb']:>9.1f}MB "
+            f"{r['total_rss_mb']:>8.1f}MB {r['total_pss_mb']:>8.1f}MB"
+        )
+    naive, cluster = results
+    print(f"\n[OK] Cluster tiết kiệm {naive['total_pss_mb'] - cluster['total_pss_mb']:.1f} MB (tổng PSS)")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"[OK] Đã ghi kết quả: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark decode ảnh: full decode (cũ) vs fast decode (draft mode JPEG)
+Sử dụng: python benchmarks/bench_decode.py <thư mục ảnh> [--repeat 3]
+
+Mỗi chế độ chạy trong 1 process riêng để đo peak RSS độc lập.
+"""
+import argparse
+import io
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import BACKEND_ROOT, load_corpus, peak_rss_mb, summarize
+
+
+def run_mode(mode: str, corpus_dir: Path, repeat: int) -> dict:
+    from PIL import Image
+    from app.config import get_settings
+    from app.services.ml_inference_service import decode_image_for_model
+
+    settings = get_settings()
+    size = settings.MODEL_IMG_SIZE
+    corpus = load_corpus(corpus_dir)
+    baseline_rss = peak_rss_mb()
+
+    latencies = []
+    failures = 0
+    for _ in range(repeat):
+        for _, image_bytes in corpus:
+            start = time.perf_counter()
+            try:
+                if mode == "legacy":
+                    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+                else:
+                    image = decode_image_for_model(image_bytes, size, settings.MODEL_MAX_IMAGE_PIXELS)
+                image.resize((size, size), Image.BILINEAR)
+            except Exception:
+                failures += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    stats = summarize(latencies)
+    return {
+        "mode": mode,
+        "images": len(corpus),
+        "repeat": repeat,
+        "failures": failures,
+        "p50_ms": stats.get("p50_ms"),
+        "p95_ms": stats.get("p95_ms"),
+        "mean_ms": stats.get("mean_ms"),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_delta_mb": peak_rss_mb() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decode ảnh (legacy vs fast)")
+    parser.add_argument("corpus", type=Path, help="Thư mục chứa ảnh upload thực tế (ưu tiên ảnh lớn)")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp qua corpus (mặc định: 3)")
+    parser.add_argument("--mode", choices=["legacy", "fast"], help=argparse.SUPPRESS)
+    parser.add_argument("--json", type=Path, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: chạy 1 chế độ và in kết quả JSON
+        print(json.dumps(run_mode(args.mode, args.corpus, args.repeat)))
+        return
+
+    if not args.corpus.is_dir():
+        print(f"[ERROR] Không tìm thấy thư mục ảnh: {args.corpus}")
+        sys.exit(1)
+
+    results = []
+    for mode in ("legacy", "fast"):
+        output = subprocess.run(
+            [sys.executable, __file__, str(args.corpus), "--repeat", str(args.repeat), "--mode", mode],
+            check=True, capture_output=True, text=True, cwd=BACKEND_ROOT,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':<8} {'images':>7} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'peak RSS MB':>12} {'Δ RSS MB':>9}")
+    for r in results:
+        print(
+            f"{r['mode']:<8} {r['images']:>7} {r['p50_ms'] or 0:>9.2f} {r['p95_ms'] or 0:>9.2f} "
+            f"{r['mean_ms'] or 0:>9.2f} {r['peak_rss_mb']:>12.1f} {r['peak_rss_delta_mb']:>9.1f}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n[OK] Đã ghi kết quả: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark các chế độ upload của predict: multipart (/predict) vs raw body (/predict/raw)
+vs RGB đã resize sẵn ở client (/predict/rgb)
+Sử dụng: python benchmarks/bench_ingest.py [--images <thư mục ảnh>] [--requests 200]
+
+Mặc định tắt prediction cache / perceptual hash để đo đủ đường decode + forward.
+--with-cache: mọi request sau lần đầu trúng cache -> chỉ còn chi phí nhận body / parse multipart.
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_predict import configure_environment
+from benchmarks.common import load_corpus, summarize, synthetic_images
+
+MODES = ("multipart", "raw", "rgb")
+
+
+def to_rgb_payload(image_bytes: bytes, size: int) -> bytes:
+    """Giả lập client: decode + resize về size x size RGB (như canvas getImageData bỏ alpha)"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB").resize((size, size), Image.BILINEAR)
+    return image.tobytes()
+
+
+async def _bench(corpus, requests: int) -> dict:
+    import httpx
+
+    from app.config import get_settings
+    from app.database import SessionLocal, init_db
+    from app.main import app
+    from app.services.auth_service import AuthService
+    from app.services.model_manager import model_manager
+
+    init_db()
+    db = SessionLocal()
+    try:
+        auth_service = AuthService(db)
+        user = auth_service.register(email=f"bench-{time.time_ns()}@example.com", password="bench-password")
+        token = auth_service.create_access_token(user.id)
+    finally:
+        db.close()
+    model_manager.load()
+
+    size = get_settings().MODEL_IMG_SIZE
+    rgb_corpus = [to_rgb_payload(image_bytes, size) for _, image_bytes in corpus]
+    auth = {"Authorization": f"Bearer {token}"}
+    raw_headers = {**auth, "Content-Type": "application/octet-stream"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def send(mode: str, index: int):
+            name, image_bytes = corpus[index % len(corpus)]
+            if mode == "multipart":
+                return await client.post(
+                    "/api/v1/predict", headers=auth, files={"file": (name, image_bytes, "image/jpeg")}
+                )
+            if mode == "raw":
+                return await client.post("/api/v1/predict/raw", headers=raw_headers, content=image_bytes)
+            return await client.post(
+                "/api/v1/predict/rgb", headers=raw_headers, content=rgb_corpus[index % len(corpus)]
+            )
+
+        results = {}
+        for mode in MODES:
+            await send(mode, 0)  # Warmup
+            latencies = []
+            errors = 0
+            for index in range(requests):
+                start = time.perf_counter()
+                response = await send(mode, index)
+                elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+            stats = summarize(latencies)
+            stats["errors"] = errors
+            stats["avg_body_kb"] = (
+                sum(len(p) for p in rgb_corpus) if mode == "rgb" else sum(len(b) for _, b in corpus)
+            ) / len(corpus) / 1024
+            results[mode] = stats
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multipart vs raw vs pre-resized RGB upload")
+    parser.add_argument("--images", type=Path, help="Thư mục ảnh (mặc định: ảnh JPEG giả lập 1280x960)")
+    parser.add_argument("--synthetic", type=int, default=16, help="Số ảnh giả lập khi không có --images")
+    parser.add_argument("--requests", type=int, default=200, help="Số request tuần tự cho mỗi chế độ")
+    parser.add_argument("--with-cache", action="store_true", help="Giữ prediction cache bật (chỉ đo ingestion)")
+    parser.add_argument("--json", type=Path, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    configure_environment(Path(tempfile.mkdtemp(prefix="bench-ingest-")), args.with_cache)
+    corpus = load_corpus(args.images) if args.images else synthetic_images(args.synthetic)
+    if not corpus:
+        print("[ERROR] Không có ảnh để benchmark")
+        sys.exit(1)
+
+    results = asyncio.run(_bench(corpus, args.requests))
+
+    print(f"{'mode':<10} {'body KB':>8} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9} {'req/s':>8} {'errors':>7}")
+    for mode, stats in results.items():
+        print(
+            f"{mode:<10} {stats['avg_body_kb']:>8.1f} {stats.get('p50_ms', 0):>9.2f} {stats.get('p95_ms', 0):>9.2f} "
+            f"{stats.get('mean_ms', 0):>9.2f} {stats.get('throughput_per_s', 0):>8.1f} {stats['errors']:>7}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n[OK] Đã ghi kết quả: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
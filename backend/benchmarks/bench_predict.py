@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark hot path của predict
+Sử dụng: python benchmarks/bench_predict.py [--images <thư mục ảnh>] [--baseline benchmarks/baseline.json]
+
+Đo:
+  - stages: decode / preprocess / forward của MLInferenceService (từng ảnh)
+  - batch:  preprocess + forward với batch size 1..64 (latency mỗi batch, throughput ảnh/giây)
+  - endpoint: toàn bộ request POST /api/v1/predict qua ASGI test client, DB SQLite tạm
+Kết quả (p50/p95/p99, throughput, peak RSS) ghi ra JSON. Nếu có --baseline, exit code 1
+khi metric nào chậm hơn baseline quá --max-regression phần trăm.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.common import BACKEND_ROOT, load_corpus, peak_rss_mb, summarize, synthetic_images
+
+DEFAULT_BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def configure_environment(tmp_dir: Path, with_cache: bool):
+    """Phải gọi trước khi import app (settings được cache bằng lru_cache)"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{(tmp_dir / 'bench.db').as_posix()}"
+    os.environ["PLAN_FREE_MONTHLY_QUOTA"] = str(10 ** 9)
+    if not with_cache:
+        # Đo đường inference thật, không để cache / perceptual hash / triage trả kết quả
+        os.environ["PREDICTION_CACHE_ENABLED"] = "false"
+        os.environ["PHASH_ENABLED"] = "false"
+        os.environ["TRIAGE_ENABLED"] = "false"
+
+
+def bench_stages(service, corpus, iterations: int) -> dict:
+    import torch
+
+    decode, preprocess, forward = [], [], []
+    for _ in range(iterations):
+        for _, image_bytes in corpus:
+            t0 = time.perf_counter()
+            image = service.decode_image(image_bytes)
+            t1 = time.perf_counter()
+            input_tensor = service.preprocessor([image])
+            t2 = time.perf_counter()
+            with torch.inference_mode():
+                service.forward(input_tensor)
+            t3 = time.perf_counter()
+            decode.append((t1 - t0) * 1000)
+            preprocess.append((t2 - t1) * 1000)
+            forward.append((t3 - t2) * 1000)
+    return {
+        "decode": summarize(decode),
+        "preprocess": summarize(preprocess),
+        "forward": summarize(forward),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_batch_sizes(service, corpus, batch_sizes, iterations: int) -> dict:
+    import torch
+
+    images = [service.decode_image(image_bytes) for _, image_bytes in corpus]
+    results = {}
+    for batch_size in batch_sizes:
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            input_tensor = service.preprocessor(batch)
+            with torch.inference_mode():
+                service.forward(input_tensor)
+            latencies.append((time.perf_counter() - start) * 1000)
+        stats = summarize(latencies)
+        stats["images_per_s"] = batch_size * 1000 / stats["mean_ms"]
+        stats["peak_rss_mb"] = peak_rss_mb()
+        results[str(batch_size)] = stats
+    return results
+
+
+async def _bench_endpoint(corpus, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    from app.database import SessionLocal, init_db
+    from app.main import app
+    from app.services.auth_service import AuthService
+
+    init_db()
+    db = SessionLocal()
+    try:
+        auth_service = AuthService(db)
+        user = auth_service.register(email=f"bench-{time.time_ns()}@example.com", password="bench-password")
+        token = auth_service.create_access_token(user.id)
+    finally:
+        db.close()
+
+    headers = {"Authorization": f"Bearer {token}"}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one_request(index: int):
+            nonlocal errors
+            name, image_bytes = corpus[index % len(corpus)]
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/v1/predict", headers=headers, files={"file": (name, image_bytes, "image/jpeg")}
+                )
+                elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+        # Warmup (model load lazy, kernel selection lần đầu)
+        await one_request(0)
+        latencies.clear()
+        errors = 0
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(requests)))
+        wall_s = time.perf_counter() - start
+
+    stats = summarize(latencies)
+    stats["errors"] = errors
+    stats["concurrency"] = concurrency
+    stats["requests_per_s"] = len(latencies) / wall_s if wall_s else 0.0
+    stats["peak_rss_mb"] = peak_rss_mb()
+    return stats
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path))
+        elif isinstance(value, (int, float)):
+            flat[path] = value
+    return flat
+
+
+def find_regressions(results: dict, baseline: dict, max_regression_pct: float) -> list:
+    """Metric *_ms tăng hoặc throughput (*_per_s) giảm quá max_regression_pct so với baseline"""
+    current = _flatten(results["metrics"])
+    previous = _flatten(baseline["metrics"])
+    tolerance = max_regression_pct / 100
+    regressions = []
+    for path, old in previous.items():
+        new = current.get(path)
+        if new is None or not old:
+            continue
+        if path.endswith("_ms") and new > old * (1 + tolerance):
+            regressions.append((path, old, new))
+        elif path.endswith("_per_s") and new < old * (1 - tolerance):
+            regressions.append((path, old, new))
+    return regressions
+
+
+def print_report(metrics: dict):
+    print(f"{'section':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'throughput':>12}")
+    rows = [(f"stage.{name}", metrics["stages"][name]) for name in ("decode", "preprocess", "forward")]
+    rows += [(f"batch.{size}", stats) for size, stats in metrics["batch"].items()]
+    if "endpoint" in metrics:
+        rows.append(("endpoint./api/v1/predict", metrics["endpoint"]))
+    for name, stats in rows:
+        if not stats.get("count"):
+            continue
+        throughput = stats.get("images_per_s") or stats.get("requests_per_s") or stats["throughput_per_s"]
+        print(f"{name:<24} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {throughput:>10.1f}/s")
+    print(f"\nPeak RSS: {peak_rss_mb():.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark predict hot path")
+    parser.add_argument("--images", type=Path, help="Thư mục ảnh (mặc định: ảnh JPEG giả lập 1280x960)")
+    parser.add_argument("--synthetic", type=int, default=16, help="Số ảnh giả lập khi không có --images")
+    parser.add_argument("--iterations", type=int, default=5, help="Số lần lặp mỗi phép đo")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--requests", type=int, default=200, help="Số request cho benchmark endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số request đồng thời tới endpoint")
+    parser.add_argument("--skip-endpoint", action="store_true", help="Bỏ qua benchmark endpoint")
+    parser.add_argument("--with-cache", action="store_true", help="Giữ prediction cache / perceptual hash bật")
+    parser.add_argument("--output", type=Path, default=BACKEND_ROOT / "data" / "benchmarks" / "latest.json")
+    parser.add_argument("--baseline", type=Path, help="File JSON baseline để so sánh")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="Phần trăm chậm hơn tối đa cho phép")
+    parser.add_argument("--save-baseline", action="store_true", help="Ghi kết quả lần chạy này làm baseline")
+    args = parser.parse_args()
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench-predict-"))
+    configure_environment(tmp_dir, args.with_cache)
+
+    import torch
+
+    from app.config import get_settings
+    from app.services.model_manager import model_manager
+
+    settings = get_settings()
+    model_manager.load()
+    ml_service = model_manager.ml_service
+    corpus = load_corpus(args.images) if args.images else synthetic_images(args.synthetic)
+    if not corpus:
+        print("[ERROR] Không có ảnh để benchmark")
+        sys.exit(1)
+
+    print(f"[SETUP] {len(corpus)} ảnh, backend={settings.MODEL_BACKEND}, torch threads={torch.get_num_threads()}")
+    metrics = {
+        "stages": bench_stages(ml_service, corpus, args.iterations),
+        "batch": bench_batch_sizes(ml_service, corpus, args.batch_sizes, args.iterations),
+    }
+    if not args.skip_endpoint:
+        metrics["endpoint"] = asyncio.run(_bench_endpoint(corpus, args.requests, args.concurrency))
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model_backend": settings.MODEL_BACKEND,
+            "images": len(corpus),
+            "iterations": args.iterations,
+        },
+        "metrics": metrics,
+    }
+
+    print()
+    print_report(metrics)
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"[OK] Đã ghi kết quả: {args.output}")
+
+    if args.save_baseline:
+        baseline_path = args.baseline or BACKEND_ROOT / "benchmarks" / "baseline.json"
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"[OK] Đã lưu baseline: {baseline_path}")
+        return
+
+    if args.baseline:
+        if not args.baseline.exists():
+            print(f"[WARNING] Không tìm thấy baseline: {args.baseline}")
+            return
+        regressions = find_regressions(results, json.loads(args.baseline.read_text()), args.max_regression)
+        if regressions:
+            print(f"\n[ERROR] {len(regressions)} metric chậm hơn baseline quá {args.max_regression}%:")
+            for path, old, new in regressions:
+                print(f"   {path}: {old:.2f} -> {new:.2f}")
+            sys.exit(1)
+        print(f"\n[OK] Không có regression so với baseline (ngưỡng {args.max_regression}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark quota khi nhiều request của cùng 1 user chạy song song:
+check rồi increment (cũ) vs giữ quota bằng 1 lệnh UPDATE có điều kiện (reserve_quota)
+Sử dụng: python benchmarks/bench_quota.py [--threads 16] [--requests 2000] [--quota 500]
+
+Cũ: đọc remaining -> (inference) -> đọc used_quota, cộng trong Python, commit.
+Request song song cùng thấy remaining > 0 nên vượt quota, và ghi đè lẫn nhau nên mất lượt đếm.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+MODES = ("legacy", "atomic")
+
+
+def legacy_attempt(db, user_id: int, inference_s: float) -> bool:
+    from app.models.subscription import Subscription
+    from app.services.subscription_service import SubscriptionService
+
+    quota_check = SubscriptionService(db).check_quota(user_id)
+    if not quota_check["allowed"]:
+        return False
+    time.sleep(inference_s)
+    subscription = db.query(Subscription).filter(Subscription.id == quota_check["subscription_id"]).first()
+    subscription.used_quota += 1
+    db.commit()
+    return True
+
+
+def atomic_attempt(db, user_id: int, inference_s: float) -> bool:
+    from app.services.subscription_service import SubscriptionService
+
+    reservation = SubscriptionService(db).reserve_quota(user_id)
+    if not reservation["allowed"]:
+        return False
+    time.sleep(inference_s)
+    return True
+
+
+def run_mode(mode: str, user_id: int, args) -> dict:
+    from app.database import SessionLocal
+    from app.models.subscription import Subscription
+
+    db = SessionLocal()
+    subscription = db.query(Subscription).filter(Subscription.user_id == user_id).first()
+    subscription.monthly_quota = args.quota
+    subscription.used_quota = 0
+    db.commit()
+    db.close()
+
+    attempt = legacy_attempt if mode == "legacy" else atomic_attempt
+    lock = threading.Lock()
+    counts = {"allowed": 0, "errors": 0}
+
+    def worker(_):
+        db = SessionLocal()
+        try:
+            allowed = attempt(db, user_id, args.inference_ms / 1000)
+        except Exception:
+            db.rollback()
+            allowed = None
+        finally:
+            db.close()
+        with lock:
+            if allowed is None:
+                counts["errors"] += 1
+            else:
+                counts["allowed"] += allowed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    db = SessionLocal()
+    used = db.query(Subscription.used_quota).filter(Subscription.user_id == user_id).scalar()
+    db.close()
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "throughput_per_s": args.requests / elapsed,
+        "allowed": counts["allowed"],
+        "errors": counts["errors"],
+        "used_quota": used,
+        "over_quota": max(counts["allowed"] - args.quota, 0),
+        "lost_updates": counts["allowed"] - used,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark quota check+increment vs atomic reserve")
+    parser.add_argument("--threads", type=int, default=16, help="Số request song song (mặc định: 16)")
+    parser.add_argument("--requests", type=int, default=2000, help="Tổng số request (mặc định: 2000)")
+    parser.add_argument("--quota", type=int, default=500, help="Monthly quota của user (mặc định: 500)")
+    parser.add_argument("--inference-ms", type=float, default=2.0,
+                        help="Thời gian giả lập inference giữa check và increment (mặc định: 2)")
+    parser.add_argument("--json", type=Path, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bench-quota-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{(tmp_dir / 'bench.db').as_posix()}"
+
+    from app.database import SessionLocal, init_db
+    from app.services.auth_service import AuthService
+
+    init_db()
+    db = SessionLocal()
+    try:
+        user_id = AuthService(db).register(email=f"bench-{time.time_ns()}@example.com", password="bench-password").id
+    finally:
+        db.close()
+
+    results = [run_mode(mode, user_id, args) for mode in MODES]
+
+    print(f"{'mode':<8} {'req/s':>9} {'allowed':>8} {'used':>6} {'over quota':>11} {'lost':>6} {'errors':>7}")
+    for r in results:
+        print(
+            f"{r['mode']:<8} {r['throughput_per_s']:>9.1f} {r['allowed']:>8} {r['used_quota']:>6} "
+            f"{r['over_quota']:>11} {r['lost_updates']:>6} {r['errors']:>7}"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\n[OK] Đã ghi kết quả: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
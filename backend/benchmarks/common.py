@@ -0,0 +1,65 @@
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS của process hiện tại (MB), 0 nếu hệ điều hành không hỗ trợ"""
+    if resource is None:
+        return 0.0
+    # Linux: KB, macOS: bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies_ms: List[float]) -> Dict:
+    """p50/p95/p99/mean (ms) và throughput (lần/giây) của 1 chuỗi latency"""
+    if not latencies_ms:
+        return {"count": 0}
+    total = sum(latencies_ms)
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+        "mean_ms": total / len(latencies_ms),
+        "throughput_per_s": len(latencies_ms) * 1000 / total if total else 0.0,
+    }
+
+
+def load_corpus(corpus_dir: Path) -> List[Tuple[str, bytes]]:
+    files = sorted(p for p in corpus_dir.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    return [(p.name, p.read_bytes()) for p in files]
+
+
+def synthetic_images(count: int, width: int = 1280, height: int = 960, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """Tạo ảnh JPEG giả lập (gradient + nhiễu) khi không có corpus thật"""
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images = []
+    for index in range(count):
+        gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+        noise = rng.normal(0, 40, size=(height, width, 3)).astype(np.float32)
+        pixels = np.clip(gradient + noise + index * 7 % 255, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, "RGB").save(buffer, format="JPEG", quality=90)
+        images.append((f"synthetic_{index}.jpg", buffer.getvalue()))
+    return images
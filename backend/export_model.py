@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export model MobileNetV2 (.pth fp32) ra các variant và kiểm tra độ lệch so với fp32
+Sử dụng: python export_model.py [--validation-dir <thư mục ảnh>] [--backends int8 torchscript onnx]
+
+Variant nào có max |Δprob| vượt --tolerance bị đánh FAIL (exit code 1).
+int8 được calibrate trên phần ảnh riêng (--calibration-dir, hoặc --calibration-fraction đầu của validation set),
+parity check chỉ đo trên phần còn lại (held-out) để không đánh giá trên chính dữ liệu calibration.
+Script gợi ý variant nhanh nhất vẫn nằm trong tolerance để đặt MODEL_BACKEND trong .env.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import torch
+
+from app.config import get_settings
+from app.services.ml_inference_service import (
+    decode_image_for_model, load_fp32_model, resolve_export_dir, resolve_model_path
+)
+from app.services.model_variants import export_variants, load_forward, parity_check
+from app.services.preprocessing import BatchPreprocessor
+
+settings = get_settings()
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+
+
+def load_validation_batches(validation_dir, batch_size: int, synthetic: int):
+    """Ảnh validation -> list tensor batch (cùng preprocessing với production), hoặc input ngẫu nhiên"""
+    size = settings.MODEL_IMG_SIZE
+    if validation_dir is None:
+        print(f"[WARNING] Không có --validation-dir, dùng {synthetic} input ngẫu nhiên")
+        return [torch.randn(min(batch_size, synthetic - i), 3, size, size) for i in range(0, synthetic, batch_size)]
+
+    preprocessor = BatchPreprocessor(size)
+    images = []
+    for path in sorted(p for p in Path(validation_dir).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES):
+        try:
+            images.append(decode_image_for_model(path.read_bytes(), size, settings.MODEL_MAX_IMAGE_PIXELS))
+        except ValueError:
+            print(f"[WARNING] Bỏ qua ảnh lỗi: {path}")
+    # clone(): preprocessor trả về view trên buffer dùng lại
+    return [preprocessor(images[i:i + batch_size]).contiguous().clone() for i in range(0, len(images), batch_size)]
+
+
+def split_holdout(batches, fraction: float):
+    """(calibration, held-out) theo số batch; chỉ có 1 batch thì chia đôi batch đó"""
+    if len(batches) == 1 and len(batches[0]) > 1:
+        batches = list(batches[0].split((len(batches[0]) + 1) // 2))
+    count = min(len(batches) - 1, max(1, round(len(batches) * fraction)))
+    return batches[:count], batches[count:]
+
+
+def measure_latency_ms(forward, batches) -> float:
+    with torch.inference_mode():
+        forward(batches[0])  # warmup
+        start = time.perf_counter()
+        for batch in batches:
+            forward(batch)
+    return (time.perf_counter() - start) * 1000 / len(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model variants + accuracy parity check")
+    parser.add_argument("--backends", nargs="+", default=["int8", "torchscript", "onnx"],
+                        choices=["int8", "torchscript", "onnx"], help="Các variant cần export")
+    parser.add_argument("--validation-dir", type=Path, help="Thư mục ảnh validation")
+    parser.add_argument("--calibration-dir", type=Path,
+                        help="Thư mục ảnh calibrate int8 (mặc định: tách từ validation set)")
+    parser.add_argument("--calibration-fraction", type=float, default=0.5,
+                        help="Tỉ lệ validation set dùng calibrate khi không có --calibration-dir (mặc định: 0.5)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--synthetic", type=int, default=64, help="Số input ngẫu nhiên khi không có validation set")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Max |Δprob| cho phép so với fp32")
+    parser.add_argument("--skip-export", action="store_true", help="Chỉ kiểm tra các artifact đã có")
+    args = parser.parse_args()
+
+    device = torch.device("cpu")
+    model_path = resolve_model_path()
+    export_dir = resolve_export_dir()
+    model = load_fp32_model(model_path, len(settings.MODEL_CLASSES), device)
+    print(f"[OK] Model fp32: {model_path}")
+
+    batches = load_validation_batches(args.validation_dir, args.batch_size, args.synthetic)
+    if args.calibration_dir is not None:
+        calibration_batches = load_validation_batches(args.calibration_dir, args.batch_size, args.synthetic)
+    elif len(batches) > 1 or (batches and len(batches[0]) > 1):
+        calibration_batches, batches = split_holdout(batches, args.calibration_fraction)
+    else:
+        calibration_batches = []
+    if not batches or not calibration_batches:
+        print("[ERROR] Cần ít nhất 2 ảnh validation (hoặc --calibration-dir) để tách calibration / held-out")
+        sys.exit(1)
+    print(f"[OK] Calibration: {sum(len(b) for b in calibration_batches)} ảnh, "
+          f"parity check (held-out): {sum(len(b) for b in batches)} ảnh")
+
+    if not args.skip_export:
+        # int8 (static PTQ): calibrate scale của activation trên phần calibration, không dùng phần held-out
+        exported = export_variants(
+            model, model_path, export_dir, settings.MODEL_IMG_SIZE, args.backends, calibration_batches
+        )
+        for backend, path in exported.items():
+            print(f"[OK] Exported {backend}: {path} ({path.stat().st_size / (1024 * 1024):.1f} MB)")
+
+    rows = [("eager", 0.0, 0.0, 1.0, measure_latency_ms(model, batches), True)]
+    for backend in args.backends:
+        try:
+            forward = load_forward(backend, model, model_path, export_dir, device)
+        except Exception as e:
+            print(f"[ERROR] Không load được {backend}: {e}")
+            rows.append((backend, None, None, None, None, False))
+            continue
+        report = parity_check(model, forward, batches)
+        ok = report["max_abs_diff"] <= args.tolerance
+        rows.append((backend, report["max_abs_diff"], report["mean_abs_diff"], report["label_agreement"],
+                     measure_latency_ms(forward, batches), ok))
+
+    print()
+    if "int8" in args.backends:
+        print(f"int8: static PTQ ({torch.backends.quantized.engine}), Conv2d + Linear quantized "
+              f"(weights per-channel, activations calibrated on data not used for parity)")
+    print(f"{'backend':<12} {'max |Δp|':>10} {'mean |Δp|':>10} {'agree':>8} {'ms/batch':>10}  status")
+    for backend, max_diff, mean_diff, agreement, latency, ok in rows:
+        if max_diff is None:
+            print(f"{backend:<12} {'-':>10} {'-':>10} {'-':>8} {'-':>10}  FAIL")
+            continue
+        print(f"{backend:<12} {max_diff:>10.5f} {mean_diff:>10.5f} {agreement:>8.2%} {latency:>10.2f}  "
+              f"{'OK' if ok else 'FAIL'}")
+
+    passing = [row for row in rows if row[5]]
+    best = min(passing, key=lambda row: row[4])
+    print(f"\n[TIP] Variant nhanh nhất trong tolerance {args.tolerance}: MODEL_BACKEND={best[0]}")
+
+    if len(passing) != len(rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
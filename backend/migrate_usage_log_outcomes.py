@@ -0,0 +1,104 @@
+import json
+import sys
+import os
+from sqlalchemy import text
+from app.database import SessionLocal
+
+# Add current directory to path
+sys.path.append(os.getcwd())
+
+BATCH_SIZE = 5000
+
+OUTCOME_COLUMNS = {
+    "blocked": "BOOLEAN",
+    "active_mask": "INTEGER",
+    "probabilities_q": "BLOB",
+    "model_version": "VARCHAR",
+}
+
+# Index cũ trên từng cột được thay bằng index ghép
+DROP_INDEXES = ("ix_usage_logs_user_id", "ix_usage_logs_created_at")
+CREATE_INDEXES = {
+    "ix_usage_logs_user_id_created_at": "usage_logs (user_id, created_at)",
+    "ix_usage_logs_created_at_blocked": "usage_logs (created_at, blocked)",
+    "ix_usage_logs_blocked_created_at": "usage_logs (blocked, created_at)",
+}
+
+
+def parse_blocked(meta_data):
+    """Giá trị "blocked" trong JSON meta_data cũ, None nếu không có / không đọc được"""
+    try:
+        blocked = json.loads(meta_data).get("blocked")
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return blocked if isinstance(blocked, bool) else None
+
+
+def backfill(db) -> int:
+    """
+    Điền cột blocked cho các dòng cũ từ meta_data (theo từng batch id)
+    blocked = không có class active -> active_mask = 0; các dòng khác không biết class nào nên để NULL
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.execute(text(
+            "SELECT id, meta_data FROM usage_logs "
+            "WHERE id > :last_id AND blocked IS NULL AND meta_data IS NOT NULL "
+            "ORDER BY id LIMIT :limit"
+        ), {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+
+        params = []
+        for row_id, meta_data in rows:
+            blocked = parse_blocked(meta_data)
+            if blocked is not None:
+                params.append({"id": row_id, "blocked": blocked, "active_mask": 0 if blocked else None})
+        if params:
+            db.execute(text(
+                "UPDATE usage_logs SET blocked = :blocked, active_mask = :active_mask WHERE id = :id"
+            ), params)
+        db.commit()
+        updated += len(params)
+        print(f"  ... backfilled {updated} rows (up to id {last_id})")
+
+
+def migrate():
+    db = SessionLocal()
+    try:
+        # Check which columns exist
+        result = db.execute(text("PRAGMA table_info(usage_logs)")).fetchall()
+        columns = [row[1] for row in result]
+
+        for col_name, col_type in OUTCOME_COLUMNS.items():
+            if col_name not in columns:
+                print(f"Adding {col_name} column to usage_logs table...")
+                db.execute(text(f"ALTER TABLE usage_logs ADD COLUMN {col_name} {col_type}"))
+            else:
+                print(f"Column {col_name} already exists.")
+        db.commit()
+
+        print("Backfilling prediction outcomes from meta_data...")
+        updated = backfill(db)
+        print(f"Backfilled {updated} rows.")
+
+        for index_name in DROP_INDEXES:
+            print(f"Dropping index {index_name}...")
+            db.execute(text(f"DROP INDEX IF EXISTS {index_name}"))
+        for index_name, target in CREATE_INDEXES.items():
+            print(f"Creating index {index_name}...")
+            db.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {target}"))
+        db.execute(text("ANALYZE usage_logs"))
+        db.commit()
+        print("Migration successful!")
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    migrate()
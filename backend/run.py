@@ -4,7 +4,11 @@
 Script chạy server FastAPI
 Sử dụng: python run.py [options]
 """
+import os
 import sys
+import time
+import signal
+import socket
 import argparse
 import uvicorn
 from pathlib import Path
@@ -110,6 +114,156 @@ def init_database():
         sys.exit(1)
 
 
+# Worker chết trước khoảng thời gian này được coi là crash-loop -> chờ trước khi restart
+CLUSTER_MIN_UPTIME_S = 5.0
+CLUSTER_RESTART_BACKOFF_S = 2.0
+
+
+def process_memory(pid: int) -> dict:
+    """RSS / PSS / shared (MB) của process, đọc từ /proc/<pid>/smaps_rollup (Linux)"""
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Shared_Clean": "shared_mb", "Shared_Dirty": "shared_mb"}
+    memory = {"rss_mb": 0.0, "pss_mb": 0.0, "shared_mb": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] += int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def _cpu_slices(workers: int) -> list:
+    """Chia các core được phép dùng thành `workers` nhóm rời nhau (cores/N mỗi worker)"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    if workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(workers)]
+    per_worker = len(cores) // workers
+    return [cores[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_cluster_worker(app, sock: socket.socket, cores: list, pin: bool, log_level: str):
+    """Code chạy trong worker sau khi fork: pin core, đặt số torch threads, chạy uvicorn trên socket chung"""
+    import torch
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    if pin and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    # InferenceExecutor chia tiếp số core này cho các inference thread của worker
+    torch.set_num_threads(len(cores))
+
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_cluster(args):
+    """
+    Pre-fork cluster: master load weights 1 lần rồi fork N worker dùng chung (copy-on-write)
+    - Mỗi worker được pin vào cores/N core, torch intra-op threads = số core đó
+    - Master giám sát và restart worker chết; SIGUSR1 in bảng RSS/PSS từng worker
+    """
+    if not hasattr(os, "fork"):
+        print("[ERROR] Cluster mode cần os.fork (Linux/macOS)")
+        sys.exit(1)
+
+    import torch
+    from app.database import engine, init_db
+    from app.main import app
+    from app.services.model_manager import model_manager
+
+    # Master chỉ dùng 1 thread torch: thread pool OpenMP không an toàn khi fork
+    # (preload chỉ load warm-start artifact theo số threads của worker, build khi miss chạy trong worker)
+    torch.set_num_threads(1)
+    init_db()
+    engine.dispose()  # Không mang connection của master sang worker
+
+    slices = _cpu_slices(args.workers)
+    worker_cpus = None if args.no_pin else len(slices[0])
+    start = time.perf_counter()
+    preloaded = model_manager.preload(worker_cpus)
+    warm_start = f", warm start {preloaded.warm_start}" if preloaded is not None else ""
+    print(f"[OK] Model weights loaded in master ({time.perf_counter() - start:.2f}s{warm_start}), "
+          f"forking {args.workers} workers")
+
+    sock = _bind_socket(args.host, args.port)
+    workers = {}  # pid -> (slot, thời điểm start)
+    stopping = False
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_cluster_worker(app, sock, slices[slot], not args.no_pin, args.log_level)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = (slot, time.monotonic())
+        cores = ",".join(map(str, slices[slot])) if not args.no_pin else "all"
+        print(f"[CLUSTER] Worker {slot} started (pid {pid}, cores {cores})")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum, frame):
+        print(f"{'worker':>6} {'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10}")
+        for pid, (slot, _) in sorted(workers.items(), key=lambda item: item[1][0]):
+            memory = process_memory(pid)
+            print(f"{slot:>6} {pid:>8} {memory['rss_mb']:>9.1f} {memory['pss_mb']:>9.1f} {memory['shared_mb']:>10.1f}")
+        master = process_memory(os.getpid())
+        print(f"{'master':>6} {os.getpid():>8} {master['rss_mb']:>9.1f} {master['pss_mb']:>9.1f} {master['shared_mb']:>10.1f}")
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGUSR1, report)
+
+    for slot in range(args.workers):
+        spawn(slot)
+    print(f"[SERVER] Server: http://{args.host}:{args.port}")
+    print(f"[TIP] kill -USR1 {os.getpid()} để xem RSS/PSS từng worker\n")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid not in workers:
+            continue
+        slot, started_at = workers.pop(pid)
+        if stopping:
+            continue
+        print(f"[WARNING] Worker {slot} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+        if time.monotonic() - started_at < CLUSTER_MIN_UPTIME_S:
+            time.sleep(CLUSTER_RESTART_BACKOFF_S)
+        spawn(slot)
+
+    sock.close()
+    print("\n👋 Cluster đã dừng. Tạm biệt!")
+
+
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(
@@ -122,6 +276,7 @@ Ví dụ:
   python run.py --reload           # Chạy với auto-reload (dev mode)
   python run.py --host 0.0.0.0     # Cho phép truy cập từ bên ngoài
   python run.py --workers 4        # Chạy với 4 workers (production)
+  python run.py --cluster --workers 4  # Pre-fork cluster, 4 workers dùng chung weights
         """
     )
     
@@ -152,6 +307,18 @@ Ví dụ:
         help="Số lượng worker processes (production mode)"
     )
     
+    parser.add_argument(
+        "--cluster",
+        action="store_true",
+        help="Pre-fork cluster: load model 1 lần, fork --workers worker dùng chung weights"
+    )
+    
+    parser.add_argument(
+        "--no-pin",
+        action="store_true",
+        help="Cluster mode: không pin mỗi worker vào cores/N core"
+    )
+    
     parser.add_argument(
         "--log-level",
         type=str,
@@ -184,6 +351,11 @@ Ví dụ:
         print("\n[OK] Xong! Database đã được khởi tạo.")
         return
     
+    if args.cluster:
+        print(f"[START] Chạy ở chế độ CLUSTER ({args.workers} workers, pre-fork)")
+        run_cluster(args)
+        return
+    
     # Cấu hình uvicorn
     config = {
         "app": "app.main:app",
@@ -0,0 +1,188 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import image_fetcher as image_fetcher_module
+from app.services.image_fetcher import ImageFetcher, ImageFetchError
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 1024
+MAX_BYTES = 4096
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """HTTP server thay cho host ảnh thật: mỗi path là 1 tình huống"""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Host")))
+        if self.path == "/image":
+            self._send(200, PNG)
+        elif self.path == "/redirect":
+            self._redirect("/image")
+        elif self.path == "/redirect-loop":
+            self._redirect("/redirect-loop")
+        elif self.path == "/redirect-internal":
+            self._redirect(f"http://internal.test:{self.server.server_port}/image")
+        elif self.path == "/html":
+            self._send(200, b"<html></html>", content_type="text/html")
+        elif self.path == "/big-declared":
+            self._send(200, b"\0" * (MAX_BYTES + 1))
+        elif self.path == "/big-chunked":
+            # Không có Content-Length: chỉ dừng được khi đọc stream
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chunk = b"\0" * 1024
+            for _ in range(8):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path == "/slow":
+            time.sleep(1)
+            self._send(200, PNG)
+        else:
+            self._send(404, b"")
+
+    def _send(self, status, body, content_type="image/png"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _redirect(self, location):
+        self.send_response(302)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Client bỏ kết nối giữa chừng (vượt size cap / timeout) là tình huống test mong đợi
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = StandInServer(("127.0.0.1", 0), StandInHandler)
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    server.requests.clear()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def fetch(url, **kwargs):
+    """Chạy 1 lần fetch với fetcher riêng (client httpx gắn với event loop của asyncio.run)"""
+    kwargs.setdefault("allow_private_hosts", True)
+    kwargs.setdefault("max_bytes", MAX_BYTES)
+    kwargs.setdefault("timeout_s", 2.0)
+    fetcher = ImageFetcher(**kwargs)
+
+    async def run():
+        try:
+            return await fetcher.fetch(url)
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(run())
+
+
+def fetch_error(url, **kwargs) -> ImageFetchError:
+    with pytest.raises(ImageFetchError) as exc_info:
+        fetch(url, **kwargs)
+    return exc_info.value
+
+
+@pytest.fixture
+def fake_dns(monkeypatch):
+    """Resolve các host *.test theo bảng cho trước (host khác dùng DNS thật)"""
+    table = {}
+    resolve_host = image_fetcher_module.resolve_host
+
+    async def fake_resolve_host(host, port):
+        if host in table:
+            return table[host]
+        return await resolve_host(host, port)
+
+    monkeypatch.setattr(image_fetcher_module, "resolve_host", fake_resolve_host)
+    return table
+
+
+def test_fetches_image(base_url):
+    assert fetch(f"{base_url}/image") == PNG
+
+
+def test_follows_redirect(base_url, server):
+    assert fetch(f"{base_url}/redirect") == PNG
+    assert [path for path, _ in server.requests] == ["/redirect", "/image"]
+
+
+def test_too_many_redirects(base_url):
+    error = fetch_error(f"{base_url}/redirect-loop", max_redirects=2)
+    assert error.status_code == 502
+
+
+def test_rejects_non_image_content_type(base_url):
+    assert fetch_error(f"{base_url}/html").status_code == 400
+
+
+def test_size_cap_declared_length(base_url):
+    assert fetch_error(f"{base_url}/big-declared").status_code == 413
+
+
+def test_size_cap_streamed_body(base_url):
+    assert fetch_error(f"{base_url}/big-chunked").status_code == 413
+
+
+def test_timeout(base_url):
+    assert fetch_error(f"{base_url}/slow", timeout_s=0.2).status_code == 504
+
+
+def test_rejects_non_http_scheme():
+    assert fetch_error("file:///etc/passwd").status_code == 400
+
+
+def test_blocks_private_address(base_url, server):
+    error = fetch_error(f"{base_url}/image", allow_private_hosts=False)
+    assert error.status_code == 400
+    assert server.requests == []
+
+
+def test_connects_to_vetted_address_with_original_host(base_url, server, fake_dns):
+    fake_dns["images.test"] = ["127.0.0.1"]
+    url = f"http://images.test:{server.server_port}/image"
+    assert fetch(url) == PNG
+    assert server.requests == [("/image", f"images.test:{server.server_port}")]
+
+
+def test_blocks_host_resolving_to_private_address(base_url, server, fake_dns):
+    # DNS rebinding: tên miền "public" trả về IP nội bộ lúc connect -> không được gửi request
+    fake_dns["rebind.test"] = ["93.184.216.34", "127.0.0.1"]
+    error = fetch_error(f"http://rebind.test:{server.server_port}/image", allow_private_hosts=False)
+    assert error.status_code == 400
+    assert server.requests == []
+
+
+def test_blocks_redirect_to_private_address(base_url, server, fake_dns, monkeypatch):
+    # 127.0.0.1 đóng vai CDN public, internal.test trỏ vào 1 địa chỉ nội bộ khác
+    monkeypatch.setattr(image_fetcher_module, "is_public_address", lambda address: address == "127.0.0.1")
+    fake_dns["cdn.test"] = ["127.0.0.1"]
+    fake_dns["internal.test"] = ["127.0.0.2"]
+    error = fetch_error(f"http://cdn.test:{server.server_port}/redirect-internal", allow_private_hosts=False)
+    assert error.status_code == 400
+    assert [path for path, _ in server.requests] == ["/redirect-internal"]
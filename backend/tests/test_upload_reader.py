@@ -0,0 +1,106 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.upload_reader import (
+    MULTIPART_OVERHEAD_BYTES,
+    READ_CHUNK_BYTES,
+    SNIFF_BYTES,
+    UploadReader,
+    UploadRejectedError,
+    iter_multipart_file,
+    open_image,
+    sniff_image,
+)
+
+MAX_BYTES = 4 * 1024 * 1024
+BOUNDARY = "test-boundary"
+
+
+def make_image(width: int, height: int, format: str, **options) -> bytes:
+    """Ảnh nhiễu (nén kém) để file lớn hơn SNIFF_BYTES"""
+    pixels = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format, **options)
+    return buffer.getvalue()
+
+
+async def iter_chunks(data: bytes):
+    for start in range(0, len(data), READ_CHUNK_BYTES):
+        yield data[start:start + READ_CHUNK_BYTES]
+
+
+def read(data: bytes, max_pixels: int = 4096 * 4096) -> memoryview:
+    reader = UploadReader(MAX_BYTES, max_pixels=max_pixels)
+    return asyncio.run(reader.read(iter_chunks(data)))
+
+
+@pytest.mark.parametrize("options", [{"quality": 95}, {"lossless": True}], ids=["lossy", "lossless"])
+def test_accepts_webp_larger_than_sniff_bytes(options):
+    data = make_image(400, 300, "WEBP", **options)
+    assert len(data) > SNIFF_BYTES
+
+    buffer = read(data)
+
+    assert open_image(buffer).size == (400, 300)
+
+
+def test_sniffs_webp_size_from_head():
+    data = make_image(400, 300, "WEBP", lossless=True)
+
+    assert sniff_image(data[:SNIFF_BYTES]) == ("WEBP", 400, 300)
+
+
+def test_rejects_webp_over_max_pixels_before_reading_all():
+    data = make_image(400, 300, "WEBP", lossless=True)
+
+    with pytest.raises(UploadRejectedError) as error:
+        read(data, max_pixels=100 * 100)
+    assert error.value.status_code == 413
+
+
+def test_rejects_small_non_image():
+    with pytest.raises(UploadRejectedError) as error:
+        read(b"not an image" * 100)
+    assert error.value.status_code == 400
+
+
+def multipart(*parts) -> bytes:
+    """parts: (name, filename hoặc None, data)"""
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def read_part(body: bytes) -> bytes:
+    async def run():
+        chunks = iter_multipart_file(iter_chunks(body), f"multipart/form-data; boundary={BOUNDARY}")
+        return b"".join([piece async for piece in chunks])
+
+    return asyncio.run(run())
+
+
+def test_multipart_returns_file_part():
+    image = make_image(400, 300, "PNG")
+
+    assert read_part(multipart(("note", None, b"hi"), ("file", "a.png", image))) == image
+
+
+def test_multipart_image_under_other_name_is_missing_field():
+    image = make_image(400, 300, "PNG")
+    assert len(image) > MULTIPART_OVERHEAD_BYTES
+
+    with pytest.raises(UploadRejectedError) as error:
+        read_part(multipart(("image", "a.png", image)))
+    assert error.value.status_code == 422
+
+
+def test_multipart_large_form_field_is_overhead():
+    with pytest.raises(UploadRejectedError) as error:
+        read_part(multipart(("note", None, b"x" * (MULTIPART_OVERHEAD_BYTES + 1)), ("file", "a.png", b"png")))
+    assert error.value.status_code == 413
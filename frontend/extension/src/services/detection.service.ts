@@ -183,6 +183,27 @@ export class DetectionService {
     throw new Error('Unable to get image file - all methods failed');
   }
 
+  /**
+   * Whether the backend can fetch this URL itself (/api/v1/predict/url)
+   */
+  private isHttpUrl(url: string): boolean {
+    return url.startsWith('http://') || url.startsWith('https://');
+  }
+
+  /**
+   * Ask the backend to fetch and classify the image (results are cached per URL server-side)
+   */
+  private async predictByUrl(url: string, token: string): Promise<Response> {
+    return fetch(`${API_CONFIG.BASE_URL}/api/v1/predict/url?threshold=0.5`, {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ url }),
+    });
+  }
+
   /**
    * Get user filter settings from storage
    */
@@ -424,22 +445,32 @@ export class DetectionService {
         throw new Error('User not authenticated. Please login first.');
       }
 
-      // Get image as File - use canvas for imgElement or fetch for URLs
-      const imageFile = await this.getImageFile(url, imgElement);
-      
-      // Create FormData
-      const formData = new FormData();
-      formData.append('file', imageFile);
-      formData.append('threshold', '0.5');
-
-      // Call backend API with multipart/form-data
-      const response = await fetch(`${API_CONFIG.BASE_URL}/api/v1/predict`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${token}`,
-        },
-        body: formData,
-      });
+      let response: Response;
+      try {
+        // Get image as File - use canvas for imgElement or fetch for URLs
+        const imageFile = await this.getImageFile(url, imgElement);
+        
+        // Create FormData
+        const formData = new FormData();
+        formData.append('file', imageFile);
+        formData.append('threshold', '0.5');
+
+        // Call backend API with multipart/form-data
+        response = await fetch(`${API_CONFIG.BASE_URL}/api/v1/predict`, {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${token}`,
+          },
+          body: formData,
+        });
+      } catch (error) {
+        // Cross-origin / unreadable image: let the backend fetch it by URL
+        if (!this.isHttpUrl(url)) {
+          throw error;
+        }
+        console.warn('[Detection] Falling back to server-side URL fetch:', url.substring(0, 50));
+        response = await this.predictByUrl(url, token);
+      }
 
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));